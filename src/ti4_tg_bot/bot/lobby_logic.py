@@ -1,35 +1,45 @@
 """Logic for registering, entering and leaving lobbies."""
 
 import asyncio
-import tempfile
 import logging
-from pathlib import Path
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from functools import lru_cache
+import time
 from random import Random
-from datetime import datetime
-from io import BytesIO
-import re
+from typing import NamedTuple
 
-from aiogram import F, Router
-from aiogram.filters import Command, CommandStart
+from aiogram import Router
+from aiogram.filters import Command, CommandObject, CommandStart
 from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.context import FSMContext
 from aiogram.types import (
     BotCommand,
     BufferedInputFile,
     CallbackQuery,
+    InlineKeyboardMarkup,
     Message,
     User,
     Chat,
-    FSInputFile,
 )
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram.utils.media_group import MediaGroupBuilder
 
+from ti4_tg_bot.bot.workers import (
+    import_map_job,
+    map_image_job,
+    milty_map_job,
+    milty_slice_job,
+    random_map_job,
+    run_in_pool,
+    shared_map_helper,
+)
 from ti4_tg_bot.data.models import Faction
 from ti4_tg_bot.map.annots import TextMapAnnotation
-from ti4_tg_bot.map.gen_helper import MapGenHelper
+from ti4_tg_bot.map.gen_helper import split_map_string
 from ti4_tg_bot.map.milty import SliceRebalancer
 from ti4_tg_bot.map.ti4_map import TIMaybeMap, PlaceholderTile
+from ti4_tg_bot.state.locks import KeyedLocks
 
 logger = logging.getLogger(__name__)
 
@@ -48,12 +58,26 @@ r_lobby = Router()
 ChatID = int
 UserID = int
 
-MAP_STRING_REGEX = r"^\d{1,2}(?:\s\d{1,2}){35}$"
 DOWNSCALE_FACTOR = 2
+JPEG_QUALITY = 82  # Telegram re-encodes photos anyway
+LOBBY_EDIT_DELAY = 0.8  # seconds to gather joins/leaves into a single edit
 AVOID_REUPLOAD = False  # for now... TODO
 
 
-def user_att(user: User) -> str:
+class Player(NamedTuple):
+    """The parts of a Telegram user that we actually need during a game."""
+
+    id: UserID
+    full_name: str
+    username: str | None = None
+
+    @classmethod
+    def from_user(cls, user: User) -> "Player":
+        """Extract player info from a Telegram user."""
+        return cls(id=user.id, full_name=user.full_name, username=user.username)
+
+
+def user_att(user: User | Player) -> str:
     """Try to 'at' the user."""
     if user.username is not None:
         att = "@" + user.username
@@ -68,44 +92,49 @@ class LobbyStatusCallback(CallbackData, prefix="lobby_status"):
     action: str
 
 
+_CB_JOIN = LobbyStatusCallback(action="join").pack()
+_CB_LEAVE = LobbyStatusCallback(action="leave").pack()
+_CB_START = LobbyStatusCallback(action="start").pack()
+
+
 def make_joiner_kb() -> InlineKeyboardBuilder:
     """Make joiner keyboard."""
     builder = InlineKeyboardBuilder()
-    builder.button(text="Join", callback_data=LobbyStatusCallback(action="join").pack())
-    builder.button(
-        text="Leave", callback_data=LobbyStatusCallback(action="leave").pack()
-    )
-    builder.button(
-        text="Start", callback_data=LobbyStatusCallback(action="start").pack()
-    )
+    builder.button(text="Join", callback_data=_CB_JOIN)
+    builder.button(text="Leave", callback_data=_CB_LEAVE)
+    builder.button(text="Start", callback_data=_CB_START)
     return builder
 
 
+_JOINER_MARKUP = make_joiner_kb().as_markup()
+"""The joiner keyboard never changes, so we build it only once."""
+
+
 class UserChoiceCallback(CallbackData, prefix="UCC"):
-    """Lobby join or leave callback."""
+    """User choice callback (the label is looked up from the pending prompt)."""
 
     chat_id: ChatID
     user_id: UserID
-    label: str
     num: int
 
 
+@lru_cache(maxsize=4096)
+def _pack_choice(chat_id: ChatID, user_id: UserID, num: int) -> str:
+    """Packed choice callback; the same buttons get offered repeatedly."""
+    return UserChoiceCallback(chat_id=chat_id, user_id=user_id, num=num).pack()
+
+
 def make_choices_kb(
     chat_id: ChatID,
     user_id: UserID,
-    choices: list[str],
+    choices: Sequence[str],
     *,
     max_width: int | None = None,
 ) -> InlineKeyboardBuilder:
     """Make choices keyboard."""
     builder = InlineKeyboardBuilder()
     for i, choice in enumerate(choices):
-        builder.button(
-            text=choice,
-            callback_data=UserChoiceCallback(
-                chat_id=chat_id, user_id=user_id, label=choice, num=i
-            ).pack(),
-        )
+        builder.button(text=choice, callback_data=_pack_choice(chat_id, user_id, i))
     if max_width is not None:
         builder.adjust(max_width)
     return builder
@@ -114,13 +143,37 @@ def make_choices_kb(
 class GameCurrState(object):
     """Game state handler."""
 
-    def __init__(self, last_msg: Message, users: dict[UserID, User]) -> None:
+    __slots__ = (
+        "last_msg",
+        "users",
+        "user_list",
+        "seed",
+        "rng",
+        "mgh",
+        "queues",
+        "prompts",
+        "map_str_pending",
+        "locations",
+        "factions",
+    )
+
+    def __init__(self, last_msg: Message, users: dict[UserID, Player]) -> None:
         # Stuff
         self.last_msg = last_msg
         self.users = dict(users)
+        self.user_list = list(self.users.values())
         #
-        self.mgh = MapGenHelper()
-        self.queues: dict[UserID, asyncio.Queue[str]] = {}
+        self.seed = time.time_ns()
+        self.rng = Random(self.seed)
+        self.mgh = shared_map_helper()
+        # One answer slot per player, reused for every prompt
+        self.queues: dict[UserID, asyncio.Queue[str]] = {
+            uid: asyncio.Queue(maxsize=1) for uid in self.users
+        }
+        # Open prompt per user: (message ID, choices)
+        self.prompts: dict[UserID, tuple[int, Sequence[str]]] = {}
+        # Users we're currently asking for a map string
+        self.map_str_pending: set[UserID] = set()
         # State
         self.locations: dict[UserID, str] = {}
         self.factions: dict[UserID, Faction] = {}
@@ -129,49 +182,96 @@ class GameCurrState(object):
     def chat(self) -> Chat:
         return self.last_msg.chat
 
-    def generate_map(self, map_name: str) -> tuple[TIMaybeMap, FSInputFile]:
-        """Generate a map."""
-        n_players = len(self.users)
-        my_map, my_img = self.mgh.gen_random_map(
-            n_players=n_players, map_title=map_name
+    async def finalize_map(
+        self,
+        chosen_map: TIMaybeMap,
+        user_order: list[Player],
+        *,
+        downscale: int = DOWNSCALE_FACTOR,
+    ) -> tuple[BufferedInputFile, str]:
+        """Place the chosen home systems on the map; return its image and summary."""
+        home_coords = {
+            v.home_name: c
+            for c, v in chosen_map.cells.items()
+            if (isinstance(v, PlaceholderTile) and v.home_name is not None)
+        }
+
+        lines = ["Final Game Setup"]
+        for i, user in enumerate(user_order):
+            loc = self.locations[user.id]
+            fac = self.factions[user.id]
+
+            home_coord = home_coords[loc]
+            home_tile = self.mgh.game_info.tiles.get_faction_home(fac.name)
+            # Replce home tile and add annotation
+            chosen_map.cells[home_coord] = home_tile
+            chosen_map.annotations.append(  # TODO - consider replacing annotation?...
+                TextMapAnnotation(
+                    cell=home_coord,
+                    offset=(0, -120),
+                    text=user_att(user),
+                    font_size=80,
+                )
+            )
+            # Add info
+            fac_o = f'<a href="{fac.wiki}">{fac.name}</a>'
+            lines.append(f"{i+1}. {user_att(user)} at {loc} playing as <b>{fac_o}</b>")
+        lines.append("Have fun! Use /start to create a new lobby, if necessary.")
+        # Encode map file
+        data = await run_in_pool(
+            map_image_job, chosen_map, downscale=downscale, quality=JPEG_QUALITY
+        )
+        img = BufferedInputFile(data, filename=f"{self.chat.id}.jpg")
+        return img, "\n".join(lines)
+
+    async def generate_map(self, map_name: str) -> tuple[TIMaybeMap, BufferedInputFile]:
+        """Generate a map in a worker process."""
+        my_map, data = await run_in_pool(
+            random_map_job,
+            len(self.users),
+            map_name,
+            downscale=DOWNSCALE_FACTOR,
+            quality=JPEG_QUALITY,
         )
-        tmpdir = tempfile.TemporaryDirectory().__enter__()  # yeah I know, sue me
-        Path(tmpdir).mkdir(exist_ok=True, parents=True)
-        file_name = f"{tmpdir}/{map_name}.jpg"
-        w, h = my_img.size
-        my_img.convert("RGB").resize((w // 2, h // 2)).save(file_name)
-        return my_map, FSInputFile(file_name)
-
-    def map_from_string(self, map_str: str) -> tuple[TIMaybeMap, FSInputFile]:
-        """Make a map from a map string."""
+        return my_map, BufferedInputFile(data, filename=f"{map_name}.jpg")
+
+    async def map_from_string(
+        self, map_str: str
+    ) -> tuple[TIMaybeMap, BufferedInputFile]:
+        """Make a map from a map string (in a worker process)."""
         map_name = "imported_map"
-        n_players = len(self.users)
-        my_map, my_img = self.mgh.import_map(
-            n_players=n_players, map_string=map_str, map_title="Imported Map"
+        my_map, data = await run_in_pool(
+            import_map_job,
+            len(self.users),
+            map_str,
+            "Imported Map",
+            downscale=DOWNSCALE_FACTOR,
+            quality=JPEG_QUALITY,
         )
+        return my_map, BufferedInputFile(data, filename=f"{map_name}.jpg")
 
-        tmpdir = tempfile.TemporaryDirectory().__enter__()  # yeah I know, sue me
-        Path(tmpdir).mkdir(exist_ok=True, parents=True)
-        file_name = f"{tmpdir}/{map_name}.jpg"
-        w, h = my_img.size
-        my_img.convert("RGB").resize((w // 2, h // 2)).save(file_name)
-        return my_map, FSInputFile(file_name)
+    def _fresh_queue(self, user_id: UserID) -> asyncio.Queue[str]:
+        """Get the user's answer queue, dropping any answer nobody asked for."""
+        qq = self.queues[user_id]
+        while not qq.empty():
+            qq.get_nowait()
+        return qq
 
     async def request_choice(
         self,
-        user: UserID | User,
+        user: UserID | Player,
         prompt: str,
-        choices: list[str],
+        choices: Sequence[str],
         *,
         max_width: int | None = None,
     ) -> str:
         """Helper to request a choice of a user."""
-        if isinstance(user, User):
+        if isinstance(user, Player):
             user_id = user.id
         else:
             user_id = user
 
-        if user_id not in self.users.keys():
+        if user_id not in self.users:
             raise ValueError("Bad user ID given.")
         user = self.users[user_id]
 
@@ -182,35 +282,48 @@ class GameCurrState(object):
             choices=choices,
             max_width=max_width,
         ).as_markup()
-        qq = asyncio.Queue[str]()
-        self.queues[user_id] = qq
+        qq = self._fresh_queue(user_id)
 
         at_prompt = f"{user_att(user)}: {prompt}"
-        req_msg = await self.last_msg.answer(at_prompt, reply_markup=kb)
-        res = await qq.get()
+        # Placeholder (no message ID yet), so /mapstr can't answer this meanwhile
+        self.prompts[user_id] = (-1, choices)
+        try:
+            req_msg = await self.last_msg.answer(at_prompt, reply_markup=kb)
+            self.prompts[user_id] = (req_msg.message_id, choices)
+            try:
+                res = await qq.get()
+            except asyncio.CancelledError:
+                # Remove the stale keyboard, so it can't be pressed later
+                await req_msg.edit_text(f"{user.full_name}: {prompt}\nSkipped.")
+                raise
+        finally:
+            self.prompts.pop(user_id, None)
         await req_msg.edit_text(f"{user.full_name}: {prompt}\nChosen: {res}")
         return res
 
     async def request_map_string(
         self,
-        user: UserID | User,
+        user: UserID | Player,
         prompt: str,
     ) -> str:
         """Request a map string."""
-        if isinstance(user, User):
+        if isinstance(user, Player):
             user_id = user.id
         else:
             user_id = user
-        if user_id not in self.users.keys():
+        if user_id not in self.users:
             raise ValueError("Bad user ID given.")
         user = self.users[user_id]
 
-        qq = asyncio.Queue[str]()
-        self.queues[user_id] = qq
+        qq = self._fresh_queue(user_id)
 
         at_prompt = f"{user_att(user)}: {prompt}"
-        await self.last_msg.answer(at_prompt)
-        res = await qq.get()
+        self.map_str_pending.add(user_id)
+        try:
+            await self.last_msg.answer(at_prompt)
+            res = await qq.get()
+        finally:
+            self.map_str_pending.discard(user_id)
         return res
 
 
@@ -224,13 +337,50 @@ FLOW_MSG = "\n".join(
 )
 
 
+def _log_task_error(task: asyncio.Task) -> None:
+    """Done-callback for background tasks nobody awaits: log their failure."""
+    if not task.cancelled() and (exc := task.exception()) is not None:
+        logger.error(f"Background task {task.get_name()} failed", exc_info=exc)
+
+
+@dataclass(slots=True)
+class ChatState:
+    """Everything we track for a single chat, from lobby creation to game end."""
+
+    msg: Message
+    users: dict[UserID, Player] = field(default_factory=dict)
+    game: GameCurrState | None = None
+    user_str: str = ""
+    last_render: str | None = None
+    # Shared by default; only build a new one if a chat needs different buttons
+    markup: InlineKeyboardMarkup = field(default_factory=lambda: _JOINER_MARKUP)
+    pending_edit: asyncio.Task | None = None
+
+    def refresh_user_str(self) -> None:
+        """Re-render the player list; call this whenever `users` changes."""
+        self.user_str = ", ".join(u.full_name for u in self.users.values())
+
+    def cancel_pending_edit(self) -> None:
+        """Drop a scheduled lobby edit, e.g. when the lobby closes."""
+        if self.pending_edit is not None:
+            self.pending_edit.cancel()
+            self.pending_edit = None
+
+
 class GlobalBackend(object):
     """Global backend."""
 
     def __init__(self):
-        self.lobby_msg: dict[ChatID, Message] = {}
-        self.lobby_users: dict[ChatID, dict[UserID, User]] = {}
-        self.games: dict[ChatID, "GameCurrState"] = {}
+        self.chats: dict[ChatID, ChatState] = {}
+        # Lobby changes are "mutate + render", so we do them one at a time per chat
+        self._chat_locks: KeyedLocks[ChatID] = KeyedLocks()
+
+    def get_game(self, chat_id: ChatID) -> GameCurrState | None:
+        """Get the running game for the chat, if any."""
+        state = self.chats.get(chat_id)
+        if state is None:
+            return None
+        return state.game
 
     # Lobby Stuff
 
@@ -238,245 +388,197 @@ class GlobalBackend(object):
         """Create a lobby based on a given message."""
         # Ensure we don't already have a lobby
         chat_id = base_msg.chat.id
-        if chat_id in self.lobby_msg.keys():
-            await base_msg.answer("Lobby already exists for this chat.")
-            return
-        elif chat_id in self.games.keys():
-            await base_msg.answer("Can't create a lobby, game is in progress.")
-            return
-
-        # Create lobby data
-        lobby_msg = await base_msg.answer(
-            "Lobby created.", reply_markup=make_joiner_kb().as_markup()
-        )
-        self.lobby_msg[chat_id] = lobby_msg
-        self.lobby_users[chat_id] = {}
+        async with self._chat_locks[chat_id]:
+            state = self.chats.get(chat_id)
+            if state is not None and state.game is None:
+                await base_msg.answer("Lobby already exists for this chat.")
+                return
+            elif state is not None:
+                await base_msg.answer("Can't create a lobby, game is in progress.")
+                return
+
+            # Create lobby data
+            lobby_msg = await base_msg.answer(
+                "Lobby created.", reply_markup=_JOINER_MARKUP
+            )
+            self.chats[chat_id] = ChatState(msg=lobby_msg)
 
         # Add creator
         await self.add_user_to_lobby(chat_id, base_msg.from_user)
 
     async def update_lobby(self, chat_id: ChatID):
         """Update the lobby, including message."""
-        if chat_id not in self.lobby_msg:
+        state = self.chats.get(chat_id)
+        if state is None or state.game is not None:
             # raise ValueError(f"Bad chat ID: {chat_id}")
             # TODO: Log weirdness
             return
 
-        msg = self.lobby_msg[chat_id]
-        users = self.lobby_users[chat_id]
+        users = state.users
         if len(users) == 0:
-            await msg.edit_text("Lobby is closed. /start to create a new one.")
-            del self.lobby_msg[chat_id]
-            del self.lobby_users[chat_id]
+            state.cancel_pending_edit()
+            await state.msg.edit_text("Lobby is closed. /start to create a new one.")
+            del self.chats[chat_id]
             return
-        else:
-            user_str = ", ".join(u.full_name for u in users.values())
-            await msg.edit_text(
-                f"In lobby: {user_str}", reply_markup=make_joiner_kb().as_markup()
+        elif state.pending_edit is None:
+            # Edit a bit later, so a burst of joins/leaves becomes a single edit
+            state.pending_edit = asyncio.create_task(
+                self._delayed_lobby_edit(chat_id, state),
+                name=f"lobby_edit_{chat_id}",
+            )
+            state.pending_edit.add_done_callback(_log_task_error)
+
+    async def _delayed_lobby_edit(self, chat_id: ChatID, state: ChatState):
+        """Show the latest lobby members, after waiting for more changes."""
+        await asyncio.sleep(LOBBY_EDIT_DELAY)
+        async with self._chat_locks[chat_id]:
+            state.pending_edit = None
+            if self.chats.get(chat_id) is not state or state.game is not None:
+                return
+            # Skip the request if nobody actually joined or left
+            if state.last_render == state.user_str:
+                return
+            await state.msg.edit_text(
+                f"In lobby: {state.user_str}", reply_markup=state.markup
             )
+            state.last_render = state.user_str
 
     async def add_user_to_lobby(self, chat_id: ChatID, user: User | None):
         """Add user to the lobby."""
         if user is None:
             # TODO: Log weirdness
             return
-        self.lobby_users[chat_id][user.id] = user
-        await self.update_lobby(chat_id)
+        async with self._chat_locks[chat_id]:
+            state = self.chats.get(chat_id)
+            if state is None or state.game is not None:
+                return  # lobby was closed in the meantime
+            if user.id not in state.users:
+                state.users[user.id] = Player.from_user(user)
+                state.refresh_user_str()
+            await self.update_lobby(chat_id)
 
     async def remove_user_from_lobby(self, chat_id: ChatID, user: User | None):
         """Remove user from the lobby."""
         if user is None:
             # TODO: log weirdness
             return
-        if user.id in self.lobby_users[chat_id]:
-            del self.lobby_users[chat_id][user.id]
-        await self.update_lobby(chat_id)
+        async with self._chat_locks[chat_id]:
+            state = self.chats.get(chat_id)
+            if state is None or state.game is not None:
+                return  # lobby was closed in the meantime
+            if state.users.pop(user.id, None) is not None:
+                state.refresh_user_str()
+            await self.update_lobby(chat_id)
 
     async def attempt_start_game(self, chat_id: ChatID, user: User | None):
         """Try to start the game."""
-        if chat_id not in self.lobby_msg:
-            # raise ValueError(f"Bad chat ID: {chat_id}")
-            # TODO: Log weirdness
-            return
-        if user is None:
-            # TODO: Log weirdness
-            return
-        msg = self.lobby_msg[chat_id]
-        users = self.lobby_users[chat_id]
-        if user.id not in users.keys():
-            # TODO: lol, user isn't a player
-            return
+        # Turn the lobby into a game (the game itself runs outside the lock)
+        async with self._chat_locks[chat_id]:
+            state = self.chats.get(chat_id)
+            if state is None or state.game is not None:
+                # raise ValueError(f"Bad chat ID: {chat_id}")
+                # TODO: Log weirdness
+                return
+            if user is None:
+                # TODO: Log weirdness
+                return
+            msg = state.msg
+            users = state.users
+            if user.id not in users:
+                # TODO: lol, user isn't a player
+                return
+            # Only start games we actually have a map layout for
+            counts = shared_map_helper().player_counts()
+            if len(users) not in counts:
+                await msg.answer(
+                    f"Can't start with {len(users)} players, we have layouts for: "
+                    + ", ".join(map(str, counts))
+                )
+                return
+
+            leader = users[user.id]
+            state.cancel_pending_edit()
+            await msg.edit_text(f"Starting game with players: {state.user_str}")
+            game = state.game = GameCurrState(last_msg=msg, users=users)
+        # await game.start_game(leader=user)
+
+        # TEST choice
+
+        choice = await game.request_choice(leader, FLOW_MSG, ["A", "B", "C"])
+        if choice == "A":
+            await self.game_flow_a(chat_id=chat_id, leader=leader)
+        elif choice == "B":
+            await self.game_flow_b(chat_id=chat_id, leader=leader)
+        elif choice == "C":
+            await self.game_flow_c(chat_id=chat_id, leader=leader)
+        else:
+            await msg.answer("Unknown choice - ignoring.")
+
+        await msg.answer("Game setup is done, you may /start a new lobby.")
+        del self.chats[chat_id]
 
-        user_str = ", ".join(u.full_name for u in users.values())
-        if True:
-            await msg.edit_text(f"Starting game with players: {user_str}")
-            game = GameCurrState(last_msg=msg, users=users)
-            self.games[chat_id] = game
-            del self.lobby_msg[chat_id]
-            del self.lobby_users[chat_id]
-            # await game.start_game(leader=user)
-
-            # TEST choice
-
-            choice = await game.request_choice(user, FLOW_MSG, ["A", "B", "C"])
-            if choice == "A":
-                await self.game_flow_a(chat_id=chat_id, leader=user)
-            elif choice == "B":
-                await self.game_flow_b(chat_id=chat_id, leader=user)
-            elif choice == "C":
-                await self.game_flow_c(chat_id=chat_id, leader=user)
-            else:
-                await msg.answer("Unknown choice - ignoring.")
-
-            await msg.answer("Game setup is done, you may /start a new lobby.")
-            del self.games[chat_id]
-
-    async def game_flow_a(self, chat_id: ChatID, leader: User):
+    async def game_flow_a(self, chat_id: ChatID, leader: Player):
         """Game flow A."""
-        game = self.games[chat_id]
+        game = self.chats[chat_id].game
+        assert game is not None
         msg = game.last_msg
 
         # Generate and choose map...
         N_MAPS = 3
         await game.last_msg.answer("Generating map...")
-        map_pairs = [game.generate_map(f"map_{i+1}") for i in range(N_MAPS)]
+        # Generate in worker processes, so we don't block the event loop
+        map_pairs = await asyncio.gather(
+            *(game.generate_map(f"map_{i+1}") for i in range(N_MAPS))
+        )
         map_grp = MediaGroupBuilder(caption="Map Options")
         for mp, fsif in map_pairs:
             map_grp.add_photo(fsif)
         await msg.answer_media_group(media=map_grp.build())
-        await msg.answer_poll(
-            "Choose a map.",
-            options=[f"Map {i+1}" for i in range(N_MAPS)],
-            is_anonymous=False,
-        )
-        sel_map_name = await game.request_choice(
-            leader,
-            "Which map was selected in the poll?",
-            [f"Map {i+1}" for i in range(N_MAPS)],
-        )
-        sel_map: int = int(sel_map_name[4:]) - 1
+        # Media groups can't carry a keyboard, so the leader picks right below it
+        map_names = [f"Map {i+1}" for i in range(N_MAPS)]
+        sel_map_name = await game.request_choice(leader, "Pick a map:", map_names)
+        sel_map = map_names.index(sel_map_name)
 
         chosen_map, chosen_map_img = map_pairs[sel_map]
         msg = await msg.answer_photo(
             chosen_map_img, caption=f"Playing on {sel_map_name}."
         )
 
-        # Create random order
-        # Set seed and RNG
-        seed = int(datetime.utcnow().timestamp() * 1000)
-        rng = Random(seed)
-        logger.info(f"Using seed: {seed}")
-        # await msg.answer_dice()
-
-        # Create order
-        n_players = len(game.users)
-        user_order = rng.sample(list(game.users.values()), k=n_players)
-        await msg.answer(
-            "\n".join(
-                ["Player order:"]
-                + [f"{i+1}. {user_att(u)}" for i, u in enumerate(user_order)]
-            )
-        )
-
-        # CHOOSE location
-        possible_locations = list("ABCDEF")[:n_players]
-        await msg.answer(f"Selecting location in reverse order ({n_players} -> 1).")
-        for user in reversed(user_order):
-            sel_loc = await game.request_choice(
-                user,
-                "Choose your map location:",
-                choices=possible_locations,
-            )
-            game.locations[user.id] = sel_loc
-            possible_locations.remove(sel_loc)
-
-        available_factions = {fn.name: fn for fn in game.mgh.game_info.factions}
+        await self._run_draft(game, msg, chosen_map, downscale=1)
 
-        # BAN factions
-        await msg.answer(f"Banning factions in forward order (1 -> {n_players})")
-        for user in user_order:
-            ban_fac = await game.request_choice(
-                user,
-                "Choose a faction to ban:",
-                choices=list(available_factions),
-                max_width=2,
-            )
-            del available_factions[ban_fac]
-
-        # PICK factions
-        await msg.answer(f"Picking factions in reverse order ({n_players} -> 1)")
-        for user in user_order:
-            sel_fac = await game.request_choice(
-                user,
-                "Choose a faction to play:",
-                choices=list(available_factions),
-                max_width=2,
-            )
-            sel_fac_info = available_factions[sel_fac]
-            game.factions[user.id] = sel_fac_info
-            del available_factions[sel_fac]
-
-        # RESULTS
-        home_coords = {
-            v.home_name: c
-            for c, v in chosen_map.cells.items()
-            if (isinstance(v, PlaceholderTile) and v.home_name is not None)
-        }
-        fac_to_tile = {tile.race: tile for tile in game.mgh.game_info.tiles.home_tiles}
-
-        lines = ["Final Game Setup"]
-        for i, user in enumerate(user_order):
-            loc = game.locations[user.id]
-            fac = game.factions[user.id]
-
-            home_coord = home_coords[loc]
-            home_tile = fac_to_tile[fac.name]
-            # Replce home tile and add annotation
-            chosen_map.cells[home_coord] = home_tile
-            chosen_map.annotations.append(  # TODO - consider replacing annotation?...
-                TextMapAnnotation(
-                    cell=home_coord,
-                    offset=(0, -120),
-                    text=user_att(user),
-                    font_size=80,
-                )
-            )
-            # Add info
-            fac_o = f'<a href="{fac.wiki}">{fac.name}</a>'
-            lines.append(f"{i+1}. {user_att(user)} at {loc} playing as <b>{fac_o}</b>")
-        lines.append("Have fun! Use /start to create a new lobby, if necessary.")
-        # Save map file
-        tmpdir = tempfile.TemporaryDirectory().__enter__()  # yeah I know, sue me
-        Path(tmpdir).mkdir(exist_ok=True, parents=True)
-        file_name = f"{tmpdir}/{chat_id}.jpg"
-        chosen_map_img = chosen_map.to_image(game.mgh.path_imgs)
-        chosen_map_img.convert("RGB").save(file_name)
-        img = FSInputFile(file_name)
-        # Upload and add caption
-        await msg.answer_photo(photo=img, caption="\n".join(lines))
-
-    async def game_flow_b(self, chat_id: ChatID, leader: User):
+    async def game_flow_b(self, chat_id: ChatID, leader: Player):
         """Game flow B."""
-        game = self.games[chat_id]
+        game = self.chats[chat_id].game
+        assert game is not None
         msg = game.last_msg
 
         # Generate and choose map...
         map_str = await game.request_map_string(
             leader, prompt="Please enter a map string with `/mapstr 12 ... 34`"
         )
-        chosen_map, chosen_map_img = game.map_from_string(map_str)
+        chosen_map, chosen_map_img = await game.map_from_string(map_str)
         msg = await msg.answer_photo(chosen_map_img, caption="Playing on imported map.")
 
+        await self._run_draft(game, msg, chosen_map)
+
+    async def _run_draft(
+        self,
+        game: GameCurrState,
+        msg: Message,
+        chosen_map: TIMaybeMap,
+        *,
+        downscale: int = DOWNSCALE_FACTOR,
+    ):
+        """Order, location, ban and pick phases on a chosen map (flows A and B)."""
+
         # Create random order
-        # Set seed and RNG
-        seed = int(datetime.utcnow().timestamp() * 1000)
-        rng = Random(seed)
-        logger.info(f"Using seed: {seed}")
+        logger.info(f"Using seed: {game.seed}")
         # await msg.answer_dice()
 
         # Create order
         n_players = len(game.users)
-        user_order = rng.sample(list(game.users.values()), k=n_players)
+        user_order = list(game.user_list)
+        game.rng.shuffle(user_order)
         await msg.answer(
             "\n".join(
                 ["Player order:"]
@@ -496,18 +598,24 @@ class GlobalBackend(object):
             game.locations[user.id] = sel_loc
             possible_locations.remove(sel_loc)
 
-        available_factions = {fn.name: fn for fn in game.mgh.game_info.factions}
-
-        # BAN factions
-        await msg.answer(f"Banning factions in forward order (1 -> {n_players})")
-        for user in user_order:
-            ban_fac = await game.request_choice(
-                user,
-                "Choose a faction to ban:",
-                choices=list(available_factions),
-                max_width=2,
+        available_factions = dict(game.mgh.game_info.factions_by_name)
+
+        # BAN factions (bans don't depend on each other, so everyone goes at once)
+        await msg.answer("Banning factions, everyone at the same time.")
+        ban_choices = tuple(available_factions)
+        bans = await asyncio.gather(
+            *(
+                game.request_choice(
+                    user,
+                    "Choose a faction to ban:",
+                    choices=ban_choices,
+                    max_width=2,
+                )
+                for user in user_order
             )
-            del available_factions[ban_fac]
+        )
+        for ban_fac in bans:
+            available_factions.pop(ban_fac, None)  # may be banned twice
 
         # PICK factions
         await msg.answer(f"Picking factions in reverse order ({n_players} -> 1)")
@@ -515,7 +623,7 @@ class GlobalBackend(object):
             sel_fac = await game.request_choice(
                 user,
                 "Choose a faction to play:",
-                choices=list(available_factions),
+                choices=tuple(available_factions),
                 max_width=2,
             )
             sel_fac_info = available_factions[sel_fac]
@@ -523,48 +631,15 @@ class GlobalBackend(object):
             del available_factions[sel_fac]
 
         # RESULTS
-        home_coords = {
-            v.home_name: c
-            for c, v in chosen_map.cells.items()
-            if (isinstance(v, PlaceholderTile) and v.home_name is not None)
-        }
-        fac_to_tile = {tile.race: tile for tile in game.mgh.game_info.tiles.home_tiles}
-
-        lines = ["Final Game Setup"]
-        for i, user in enumerate(user_order):
-            loc = game.locations[user.id]
-            fac = game.factions[user.id]
+        img, caption = await game.finalize_map(
+            chosen_map, user_order, downscale=downscale
+        )
+        await msg.answer_photo(photo=img, caption=caption)
 
-            home_coord = home_coords[loc]
-            home_tile = fac_to_tile[fac.name]
-            # Replce home tile and add annotation
-            chosen_map.cells[home_coord] = home_tile
-            chosen_map.annotations.append(  # TODO - consider replacing annotation?...
-                TextMapAnnotation(
-                    cell=home_coord,
-                    offset=(0, -120),
-                    text=user_att(user),
-                    font_size=80,
-                )
-            )
-            # Add info
-            fac_o = f'<a href="{fac.wiki}">{fac.name}</a>'
-            lines.append(f"{i+1}. {user_att(user)} at {loc} playing as <b>{fac_o}</b>")
-        lines.append("Have fun! Use /start to create a new lobby, if necessary.")
-        # Save map file
-        tmpdir = tempfile.TemporaryDirectory().__enter__()  # yeah I know, sue me
-        Path(tmpdir).mkdir(exist_ok=True, parents=True)
-        file_name = f"{tmpdir}/{chat_id}.jpg"
-        chosen_map_img = chosen_map.to_image(game.mgh.path_imgs)
-        w, h = chosen_map_img.size
-        chosen_map_img.convert("RGB").resize((w // 2, h // 2)).save(file_name)
-        img = FSInputFile(file_name)
-        # Upload and add caption
-        await msg.answer_photo(photo=img, caption="\n".join(lines))
-
-    async def game_flow_c(self, chat_id: ChatID, leader: User):
+    async def game_flow_c(self, chat_id: ChatID, leader: Player):
         """Game flow C."""
-        game = self.games[chat_id]
+        game = self.chats[chat_id].game
+        assert game is not None
         msg = game.last_msg
 
         # Prepare map generator
@@ -579,17 +654,15 @@ class GlobalBackend(object):
         choice_n_factions = int(choice_raw_n_factions)
 
         # Create random order
-        # Set seed and RNG
-        seed = int(datetime.utcnow().timestamp() * 1000)
-        rng = Random(seed)
+        rng = game.rng
         map_seed = rng.randint(1, 123456789)
-        logger.info(f"Main seed: {seed}")
+        logger.info(f"Main seed: {game.seed}")
         logger.info(f"Map seed: {map_seed}")
         last_msg = await msg.answer(f"Map seed: {map_seed}\nGenerating draft...")
 
         # Create order
-        n_players = len(game.users)
-        user_order = rng.sample(list(game.users.values()), k=n_players)
+        user_order = list(game.user_list)
+        rng.shuffle(user_order)
 
         # Create draft state
         sr = SliceRebalancer(
@@ -611,32 +684,28 @@ class GlobalBackend(object):
 
         # Create helper for the map image
 
-        def prep_map_img(map_title: str, filename: str) -> BufferedInputFile:
-            """Prepare map image."""
-            # Prepare and add current map to media group
-            current_map, current_map_img = gen.milty_to_image(
-                draft_state, map_title=map_title
-            )
-            w, h = current_map_img.size
-            tmpio = BytesIO()
-            current_map_img.convert("RGB").resize(
-                (w // DOWNSCALE_FACTOR, h // DOWNSCALE_FACTOR)
-            ).save(tmpio, format="PNG")
-            return BufferedInputFile(
-                tmpio.getvalue(),
-                filename=filename,
+        async def prep_map_img(map_title: str, filename: str) -> BufferedInputFile:
+            """Prepare map image (rendered in a worker process)."""
+            data = await run_in_pool(
+                milty_map_job,
+                draft_state,
+                map_title,
+                downscale=DOWNSCALE_FACTOR,
+                quality=JPEG_QUALITY,
             )
+            return BufferedInputFile(data, filename=filename)
 
         # Prepare images of slices
         logger.info("Preparing slice images...")
-        slice_imgs = draft_state.visualize_slices(gen.path_imgs)
-        slice_img_files: list[BufferedInputFile | str] = []
-        for i, si in enumerate(slice_imgs):
-            tmpio = BytesIO()
-            si.save(tmpio, format="PNG")
-            fi = BufferedInputFile(
-                tmpio.getvalue(), filename=f"{chat_id}/slice_{i}.png"
+        slice_imgs = await asyncio.gather(
+            *(
+                run_in_pool(milty_slice_job, draft_state, i, quality=JPEG_QUALITY)
+                for i in range(len(draft_state.slices))
             )
+        )
+        slice_img_files: list[BufferedInputFile | str] = []
+        for i, data in enumerate(slice_imgs):
+            fi = BufferedInputFile(data, filename=f"{chat_id}/slice_{i}.jpg")
             slice_img_files.append(fi)  # not needed?
 
         # Figure out order and play in it
@@ -705,9 +774,9 @@ class GlobalBackend(object):
 
             # Prepare and add current map to media group
             media_group.add_photo(
-                prep_map_img(
+                await prep_map_img(
                     map_title="Current Map",
-                    filename=f"{chat_id}/map_step_{curr_step}.png",
+                    filename=f"{chat_id}/map_step_{curr_step}.jpg",
                 )
             )
 
@@ -739,7 +808,7 @@ class GlobalBackend(object):
             choice_i = await game.request_choice(
                 current_user,
                 "Select " + " or ".join(prompt_i) + ":",
-                choices=list(options),
+                choices=tuple(options),
                 max_width=2,
             )
             # Apply choice
@@ -757,7 +826,9 @@ class GlobalBackend(object):
             caption=f"Game setup finalized, with {s_speaker} as the speaker."
         )
         result_mg.add_photo(
-            prep_map_img(map_title="Final Map", filename=f"{chat_id}/map_final.png")
+            await prep_map_img(
+                map_title="Final Map", filename=f"{chat_id}/map_final.jpg"
+            )
         )
         await msg.answer_media_group(result_mg.build())
         # One more, to avoid exiting the loop while still uploading
@@ -774,23 +845,27 @@ async def show_help(message: Message):
 
 
 @r_lobby.message(Command("mapstr"))
-async def set_map_string(message: Message):
+async def set_map_string(message: Message, command: CommandObject):
     """Set map string."""
     user = message.from_user
     if user is None:
         return
-    if message.text is None:
+    if not command.args:
         return
-    game = gback.games.get(message.chat.id)
+    game = gback.get_game(message.chat.id)
     if game is None:
         return
-    qq = game.queues.get(user.id)
-    if qq is None:
-        return
-    map_str = message.text.lstrip("/mapstr ").strip()
-    if re.match(MAP_STRING_REGEX, map_str):
+    if user.id not in game.map_str_pending:
+        return  # we didn't ask this user for a map string
+    qq = game.queues[user.id]
+    # NOTE: args are already stripped of the command (and any "@botname" mention)
+    toks = split_map_string(command.args)
+    if toks is not None:
+        map_str = " ".join(toks)
+        if qq.full():
+            return  # already have an answer
         await message.answer("Map string accepted.")
-        await qq.put(map_str)
+        qq.put_nowait(map_str)
     else:
         await message.answer("Improper map string, ignoring.")
 
@@ -801,40 +876,22 @@ async def start_menu(message: Message, state: FSMContext):
     await gback.create_lobby(message)
 
 
-@r_lobby.callback_query(LobbyStatusCallback.filter(F.action == "join"))
-async def cb_join(query: CallbackQuery, callback_data: LobbyStatusCallback):
-    """Join callback."""
-    #
-    msg = query.message
-    assert msg is not None
-    user = query.from_user
-    assert user is not None
-
-    await gback.add_user_to_lobby(chat_id=msg.chat.id, user=user)
-
-
-@r_lobby.callback_query(LobbyStatusCallback.filter(F.action == "leave"))
-async def cb_leave(query: CallbackQuery, callback_data: LobbyStatusCallback):
-    """Leave callback."""
-    #
-    msg = query.message
-    assert msg is not None
-    user = query.from_user
-    assert user is not None
-
-    await gback.remove_user_from_lobby(chat_id=msg.chat.id, user=user)
-
-
-@r_lobby.callback_query(LobbyStatusCallback.filter(F.action == "start"))
-async def cb_start(query: CallbackQuery, callback_data: LobbyStatusCallback):
-    """Start callback."""
+@r_lobby.callback_query(LobbyStatusCallback.filter())
+async def cb_lobby(query: CallbackQuery, callback_data: LobbyStatusCallback):
+    """Lobby button (join, leave or start) callback."""
     #
     msg = query.message
     assert msg is not None
     user = query.from_user
     assert user is not None
 
-    await gback.attempt_start_game(msg.chat.id, user=user)
+    action = callback_data.action
+    if action == "join":
+        await gback.add_user_to_lobby(chat_id=msg.chat.id, user=user)
+    elif action == "leave":
+        await gback.remove_user_from_lobby(chat_id=msg.chat.id, user=user)
+    elif action == "start":
+        await gback.attempt_start_game(msg.chat.id, user=user)
 
 
 @r_lobby.callback_query(UserChoiceCallback.filter())
@@ -847,7 +904,7 @@ async def cb_choice(query: CallbackQuery, callback_data: UserChoiceCallback):
     assert user is not None
 
     chat_id = msg.chat.id
-    game_state = gback.games.get(chat_id)
+    game_state = gback.get_game(chat_id)
     if game_state is None:
         return
     if callback_data.user_id != user.id:
@@ -855,6 +912,12 @@ async def cb_choice(query: CallbackQuery, callback_data: UserChoiceCallback):
         return
     qq = game_state.queues.get(user.id)
     if qq is None:
-        logger.warning(f"Queue for user {user.full_name} didn't exist.")
+        logger.warning(f"User {user.full_name} isn't a player in this game.")
         return
-    await qq.put(callback_data.label)
+    prompt = game_state.prompts.get(user.id)
+    if (prompt is None) or (prompt[0] != msg.message_id):
+        return  # button from an old prompt
+    choices = prompt[1]
+    if not (0 <= callback_data.num < len(choices)) or qq.full():
+        return  # bad index, or a double press
+    qq.put_nowait(choices[callback_data.num])
@@ -1,20 +1,21 @@
 """Main logic."""
 
-from datetime import datetime
-from random import Random
+from collections import deque
+from functools import lru_cache
+from random import Random, uniform
+from time import monotonic, time_ns
 
 import asyncio
 from aiogram import Bot, Router
 from aiogram.enums import ChatType
 from aiogram.filters import Command, Filter
-from aiogram.types import Message, User, BotCommand
+from aiogram.types import Message, User, BotCommand, ReplyKeyboardRemove
 from aiogram.utils.keyboard import ReplyKeyboardBuilder
 from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
 
 from ti4_tg_bot.data import base_game
-from ti4_tg_bot.state.room import GlobalState, Room, UserID
+from ti4_tg_bot.state.room import GlobalState, Room, UserID, state
 
-state = GlobalState()
 router = Router()
 
 BOTNAME = "TwilightGenBot"
@@ -55,14 +56,15 @@ cmds: dict[str, BotCommand] = {
         description="In order, players ban 1 faction each. In reverse order, they pick",
     ),
 }
+CREATE_CMDS_HELP = "\n".join(
+    f"/{k} : {v.description}" for k, v in cmds.items() if "create" in k
+)
 
 
 class PrivateOnly(Filter):
     """Only allow commands in private."""
 
     async def __call__(self, message: Message) -> bool:
-        if not isinstance(message, Message):
-            return False
         return message.chat.type in [ChatType.PRIVATE]
 
 
@@ -70,8 +72,6 @@ class GroupOnly(Filter):
     """Only allow commands in groups."""
 
     async def __call__(self, message: Message) -> bool:
-        if not isinstance(message, Message):
-            return False
         return message.chat.type in [ChatType.GROUP, ChatType.SUPERGROUP]
 
 
@@ -83,20 +83,18 @@ class InLobby(Filter):
         self.state = state
 
     async def __call__(self, message: Message) -> bool:
-        if not isinstance(message, Message):
-            return False
-        chat_id = message.chat.id
+        return message.chat.id in self.state.rooms
 
-        res = chat_id in state.rooms
-        if not res:
-            await message.answer("There is no active game. /start to create a new one.")
-        return res
+
+@lru_cache(maxsize=1024)
+def _format_at(uid: int, username: str | None, full_name: str) -> str:
+    if username:
+        return f"@{username}"
+    return full_name
 
 
 def get_at(user: User) -> str:
-    if user.username:
-        return f"@{user.username}"
-    return user.full_name
+    return _format_at(user.id, user.username, user.full_name)
 
 
 @router.message(Command(cmds["help"]))
@@ -114,8 +112,7 @@ async def show_status(message: Message) -> None:
         return
 
     room = state.rooms[chat_id]
-    members = [await message.chat.get_member(x) for x in room.users]
-    member_names = [f"{get_at(x.user)[1:]}" for x in members]
+    member_names = [room.user_names[x].removeprefix("@") for x in room.users]
     await message.answer("Current players: " + ", ".join(member_names))
 
 
@@ -125,14 +122,21 @@ async def cmd_group_start(message: Message, bot: Bot) -> None:
     chat_id = message.chat.id
     uid = message.from_user.id
 
-    # Check for existing game
-    if chat_id in state.rooms:
+    async with state.lock_for(chat_id):
+        # Check for existing game
+        exists = chat_id in state.rooms
+
+        # Start the game
+        if not exists:
+            state.rooms[chat_id] = Room(
+                chat=chat_id,
+                users={uid: None},
+                user_names={uid: get_at(message.from_user)},
+            )
+    if exists:
         await message.answer("Game already started. You may /cancel to restart.")
         return
 
-    # Start the game
-    state.rooms[chat_id] = Room(chat=chat_id, users=[uid])
-
     # Reply to the chat.
     reply = (
         f"<b>{message.from_user.full_name}</b> is starting a new game!"
@@ -140,9 +144,7 @@ async def cmd_group_start(message: Message, bot: Bot) -> None:
         + "\nYou can also /cancel the game."
         + f"\n\n<b>Please make sure to add @{BOTNAME} in personal chats.</b>"
         + "\n\nOnce everyone has joined, create the game with some setup:\n"
-        + "\n".join(
-            [f"/{k} : {v.description}" for k, v in cmds.items() if "create" in k]
-        )
+        + CREATE_CMDS_HELP
     )
     await message.answer(reply)
     await show_status(message)
@@ -165,8 +167,10 @@ async def cmd_cancel(message: Message) -> None:
     chat_id = message.chat.id
 
     # Check for existing game
-    if chat_id in state.rooms:
-        del state.rooms[chat_id]
+    async with state.lock_for(chat_id):
+        exists = chat_id in state.rooms
+        state.close_room(chat_id)
+    if exists:
         await message.answer("Canceled game. /start to create a new one.")
     else:
         await message.answer("There is no active game.")
@@ -178,11 +182,12 @@ async def cmd_join(message: Message) -> None:
     chat_id = message.chat.id
     uid = message.from_user.id
 
-    room = state.rooms[chat_id]
-    if uid not in room.users:
-        room.users.append(uid)
-
-    await show_status(message)
+    async with state.lock_for(chat_id):
+        room = state.rooms.get(chat_id)
+        if room is None:
+            return
+        room.add_user(uid, get_at(message.from_user))
+        await show_status(message)
 
 
 @router.message(Command(cmds["leave"]), GroupOnly(), InLobby(state))
@@ -191,11 +196,12 @@ async def cmd_leave(message: Message) -> None:
     chat_id = message.chat.id
     uid = message.from_user.id
 
-    room = state.rooms[chat_id]
-    if uid in room.users:
-        room.users.remove(uid)
-
-    await show_status(message)
+    async with state.lock_for(chat_id):
+        room = state.rooms.get(chat_id)
+        if room is None:
+            return
+        room.remove_user(uid)
+        await show_status(message)
 
 
 WAIT_MINS: float = 1 * 60
@@ -215,8 +221,9 @@ async def wait_until_users_add_me(bot: Bot, state: GlobalState, chat_id: int) ->
     This means that the bot can reply to the users.
     Bots can't initiate chats - it's a Telegram-side limitation to stop spam.
     """
-    time_start = datetime.utcnow()
-    while (datetime.utcnow() - time_start).total_seconds() < 60 * WAIT_MINS:
+    time_start = monotonic()
+    prev_unmessagable: list[int] = []
+    while monotonic() - time_start < 60 * WAIT_MINS:
         room = state.rooms.get(chat_id)
         # If room is canceled
         if room is None:
@@ -225,13 +232,17 @@ async def wait_until_users_add_me(bot: Bot, state: GlobalState, chat_id: int) ->
 
         # Check if we can message users
         unmessagable: list[int] = []
-        for user_id in room.users:
+        user_ids = list(room.users)
+        chat_infos = await asyncio.gather(
+            *[bot.get_chat(user_id) for user_id in user_ids], return_exceptions=True
+        )
+        for user_id, user_chat_info in zip(user_ids, chat_infos):
             # If we don't have a chat, then we fail immediately
-            try:
-                user_chat_info = await bot.get_chat(user_id)
-            except TelegramBadRequest:
+            if isinstance(user_chat_info, TelegramBadRequest):
                 unmessagable.append(user_id)
                 continue
+            elif isinstance(user_chat_info, BaseException):
+                raise user_chat_info
             # If we've been blocked or muted, we might not have permissions
             perms = user_chat_info.permissions
             if perms is not None:
@@ -242,16 +253,17 @@ async def wait_until_users_add_me(bot: Bot, state: GlobalState, chat_id: int) ->
         if len(unmessagable) == 0:
             return True
 
-        # Otherwise, ping those users
-        chat = await bot.get_chat(chat_id)
-        unmess_members = [await chat.get_member(x) for x in unmessagable]
-        unmess_ats = [f"{get_at(x.user)}" for x in unmess_members]
-        await bot.send_message(
-            chat_id,
-            "The following users need to send /start to me in a private chat: "
-            + " ".join(unmess_ats),
-        )
-        await asyncio.sleep(60 * REFRESH_MINS)
+        # Otherwise, ping those users (unless we just did)
+        if unmessagable != prev_unmessagable:
+            unmess_ats = [room.user_names[x] for x in unmessagable]
+            await bot.send_message(
+                chat_id,
+                "The following users need to send /start to me in a private chat: "
+                + " ".join(unmess_ats),
+            )
+            prev_unmessagable = unmessagable
+        # Jitter, so lobbies that started together don't poll in lockstep
+        await asyncio.sleep(60 * REFRESH_MINS + uniform(0, 0.5))
 
     await bot.send_message(
         chat_id, f"Timed out after {WAIT_MINS} minutes. Cancelling game."
@@ -259,43 +271,89 @@ async def wait_until_users_add_me(bot: Bot, state: GlobalState, chat_id: int) ->
     return False
 
 
+SELECT_TIMEOUT: float = 5 * 60
+"""How long (in seconds) a user gets to make a selection."""
+
+_KB_REMOVE = ReplyKeyboardRemove(remove_keyboard=True)
+
+
 async def ask_selection(
-    bot: Bot, state: GlobalState, prompt: str, options: list[str], user_id: int
+    bot: Bot,
+    state: GlobalState,
+    prompt: str,
+    options: list[str],
+    user_id: int,
+    timeout: float = SELECT_TIMEOUT,
+    chat_id: int | None = None,
+    rng: Random | None = None,
 ) -> str:
-    """Ask user for faction selection."""
+    """Ask user for faction selection.
+
+    If the user can't be messaged or doesn't answer in time, a default is chosen
+    for them: picked with `rng` if given (so players that time out together don't
+    all get the same option), else the first option. The group chat `chat_id` is
+    told about it, if given.
+    """
     # Create keyboard
     reply_kb = ReplyKeyboardBuilder()
     for opt in options:
         reply_kb.button(text=str(opt))
+    markup = reply_kb.as_markup(one_time_keyboard=True)
 
-    await bot.send_message(
-        user_id, prompt, reply_markup=reply_kb.as_markup(one_time_keyboard=True)
-    )
-
-    queue = asyncio.Queue()
+    queue = asyncio.Queue(maxsize=1)
     state.queues[user_id] = queue
+    opt_set = set(options)
+    error_msg = "\n".join(["Incorrect choice, choose one of:", *options])
+    default = rng.choice(options) if rng is not None else options[0]
 
-    value = ""
-    while True:
-        value = await queue.get()
-        if value in options:
-            break
+    async def _notify_default(reason: str) -> None:
+        if chat_id is None:
+            return
+        room = state.rooms.get(chat_id)
+        uname = room.user_names.get(user_id) if room is not None else None
         await bot.send_message(
-            user_id,
-            "\n".join(["Incorrect choice, choose one of:", *options]),
-            reply_markup=reply_kb.as_markup(),
+            chat_id,
+            f"{uname or 'A player'} {reason}, so {default!r} was chosen for them.",
         )
-    from aiogram.types.reply_keyboard_remove import ReplyKeyboardRemove
 
-    # Cleanup
-    del state.queues[user_id]
-    if CLEANUP_KEYBOARD:
-        await bot.send_message(
-            user_id,
-            f"Selection: {value!r}",
-            reply_markup=ReplyKeyboardRemove(remove_keyboard=True),
-        )
-    return value
+    async def _dm(text: str, **kwargs) -> bool:
+        """Message the user; False if they blocked us (the game goes on)."""
+        try:
+            await bot.send_message(user_id, text, **kwargs)
+        except TelegramForbiddenError:
+            return False
+        return True
+
+    async def _get_valid() -> str | None:
+        """Wait for a valid reply (None if they blocked us meanwhile)."""
+        while True:
+            value = await queue.get()
+            if value in opt_set:
+                return value
+            if not await _dm(error_msg, reply_markup=markup):
+                return None
+
+    try:
+        if not await _dm(prompt, reply_markup=markup):
+            # They blocked us since joining; don't wait on a prompt they never got
+            await _notify_default("can't be messaged")
+            return default
+        try:
+            value = await asyncio.wait_for(_get_valid(), timeout=timeout)
+            if value is None:
+                value = default
+                await _notify_default("can't be messaged")
+        except asyncio.TimeoutError:
+            value = default
+            await _dm("Out of time, choosing for you.")
+            await _notify_default("ran out of time")
+
+        if CLEANUP_KEYBOARD:
+            await _dm(f"Selection: {value!r}", reply_markup=_KB_REMOVE)
+        return value
+    finally:
+        # Cleanup
+        state.queues.pop(user_id, None)
 
 
 @router.message(PrivateOnly())
@@ -305,7 +363,10 @@ async def pm_get_msg(message: Message):
     queue = state.queues.get(uid)
     if queue is None:
         return
-    await queue.put(message.text)
+    # Only the latest reply counts (a burst of replies just overwrites the slot)
+    while not queue.empty():
+        queue.get_nowait()
+    queue.put_nowait(message.text)
 
 
 @router.message(Command(cmds["create_secret_only_pick"]), GroupOnly(), InLobby(state))
@@ -313,11 +374,15 @@ async def cmd_create_secret_only_pick(message: Message, bot: Bot) -> None:
     """All players pick 1 of 3 factions, at the same time."""
     chat_id = message.chat.id
     # uid = message.from_user.id  # noqa
-    room = state.rooms[chat_id]
-    if len(room.users) < MIN_PLAYERS:
+    async with state.lock_for(chat_id):
+        room = state.rooms.get(chat_id)
+        if room is None:
+            return
+        n_users = len(room.users)
+    if n_users < MIN_PLAYERS:
         await message.answer(f"Need at least {MIN_PLAYERS} players; some should /join")
         return
-    elif len(room.users) > MAX_PLAYERS:
+    elif n_users > MAX_PLAYERS:
         await message.answer(f"Need at most {MAX_PLAYERS} players; some should /leave")
         return
 
@@ -326,17 +391,17 @@ async def cmd_create_secret_only_pick(message: Message, bot: Bot) -> None:
         return
 
     # Set seed and RNG
-    seed = int(datetime.utcnow().timestamp() * 1000)
+    seed = time_ns()
     rng = Random(seed)
-    await message.answer(f"Using seed: {seed}")
     await message.answer_dice()
 
     # Create order
-    user_order = rng.sample(room.users, k=len(room.users))
-    order_mems = [await message.chat.get_member(x) for x in user_order]
-    order_names = [f"{get_at(x.user)}" for x in order_mems]
+    user_order = list(room.users)
+    rng.shuffle(user_order)
+    order_names = [room.user_names[x] for x in user_order]
     await message.answer(
-        "Play Order:\n"
+        f"Using seed: {seed}\n"
+        + "Play Order:\n"
         + "\n".join([f"{i+1}. {nm}" for i, nm in enumerate(order_names)])
     )
 
@@ -346,7 +411,8 @@ async def cmd_create_secret_only_pick(message: Message, bot: Bot) -> None:
     n_per = 3
 
     # Select race order (basically mapping to user)
-    faction_order = rng.sample(game.faction_names, k=len(game.faction_names))
+    faction_order = list(game.faction_names)
+    rng.shuffle(faction_order)
 
     # Ask users to select stuff
     # NEW: It's now in parallel!
@@ -363,6 +429,8 @@ async def cmd_create_secret_only_pick(message: Message, bot: Bot) -> None:
                 prompt="Choose faction.",
                 options=opts_i,
                 user_id=uid,
+                chat_id=chat_id,
+                rng=rng,
             )
         )
         # TODO: Selection of location too?...
@@ -370,20 +438,18 @@ async def cmd_create_secret_only_pick(message: Message, bot: Bot) -> None:
     selected: dict[int, str] = {uid: fac for uid, fac in zip(user_order, selected_facs)}
 
     # Return results
+    loc_o = " at <b>(no location)</b>" if USE_LOCATION else ""
     msg = ["Finished game setup."]
-    for i, uid in enumerate(user_order):
-        uname = order_names[i]
+    for i, (uid, uname) in enumerate(zip(user_order, order_names), start=1):
         fac = selected[uid]
-        fac_link = [x for x in game.factions if x.name == fac][0].wiki
-        fac_o = f'<a href="{fac_link}">{fac}</a>'
-        loc = "(no location)"
-        loc_o = f" at <b>{loc}</b>" if USE_LOCATION else ""
-        msg.append(f"{i+1}. {uname} as <b>{fac_o}</b>{loc_o}")
+        fac_o = f'<a href="{game.factions_by_name[fac].wiki}">{fac}</a>'
+        msg.append(f"{i}. {uname} as <b>{fac_o}</b>{loc_o}")
 
     # Close game state
     msg.append("Have fun! Use /start to create a new one.")
     await message.answer("\n".join(msg), disable_web_page_preview=True)
-    del state.rooms[chat_id]
+    async with state.lock_for(chat_id):
+        state.close_room(chat_id)
 
 
 @router.message(Command(cmds["create_public_pick_ban"]), GroupOnly(), InLobby(state))
@@ -391,11 +457,15 @@ async def cmd_create_public_pick_ban(message: Message, bot: Bot) -> None:
     """Create a game setup."""
     chat_id = message.chat.id
     uid = message.from_user.id  # noqa
-    room = state.rooms[chat_id]
-    if len(room.users) < MIN_PLAYERS:
+    async with state.lock_for(chat_id):
+        room = state.rooms.get(chat_id)
+        if room is None:
+            return
+        n_users = len(room.users)
+    if n_users < MIN_PLAYERS:
         await message.answer(f"Need at least {MIN_PLAYERS} players; some should /join")
         return
-    elif len(room.users) > MAX_PLAYERS:
+    elif n_users > MAX_PLAYERS:
         await message.answer(f"Need at most {MAX_PLAYERS} players; some should /leave")
         return
 
@@ -404,17 +474,17 @@ async def cmd_create_public_pick_ban(message: Message, bot: Bot) -> None:
         return
 
     # Set seed and RNG
-    seed = int(datetime.utcnow().timestamp() * 1000)
+    seed = time_ns()
     rng = Random(seed)
-    await message.answer(f"Using seed: {seed}")
     await message.answer_dice()
 
     # Create order
-    user_order = rng.sample(room.users, k=len(room.users))
-    order_mems = [await message.chat.get_member(x) for x in user_order]
-    order_names = [f"{get_at(x.user)}" for x in order_mems]
+    user_order = list(room.users)
+    rng.shuffle(user_order)
+    order_names = [room.user_names[x] for x in user_order]
     await message.answer(
-        "Choosing Order:\n"
+        f"Using seed: {seed}\n"
+        + "Choosing Order:\n"
         + "\n".join([f"{i+1}. {nm}" for i, nm in enumerate(order_names)])
     )
 
@@ -422,67 +492,75 @@ async def cmd_create_public_pick_ban(message: Message, bot: Bot) -> None:
     game = base_game
 
     n_per = 3
-    remaining_factions = list(game.faction_names)
+    # Shuffle once and deal from the top; offered but unchosen factions go to the back
+    deck = deque(game.faction_names)
+    rng.shuffle(deck)
 
     # Select race order (basically mapping to user)
     # Ask users to select stuff
     selected: dict[int, str] = {}
     banned: dict[int, str] = {}
-    for i, uid in list(enumerate(user_order)):  # reversed?
-        try:
-            user_chat = await bot.get_chat(chat_id=uid)
-            user_chat
-        except TelegramForbiddenError:
-            pass
-        # Pick
-        opts_pick_i = rng.sample(remaining_factions, k=n_per)
-        picked_i = await ask_selection(
-            bot=bot,
-            state=state,
-            prompt="Choose faction to PLAY:",
-            options=opts_pick_i,
-            user_id=uid,
-        )
+
+    # PICK at the same time; deals are disjoint so picks can't collide
+    n_pick = min(n_per, len(deck) // len(user_order))
+    opts_pick = {uid: [deck.popleft() for _ in range(n_pick)] for uid in user_order}
+    picks: list[str] = await asyncio.gather(
+        *[
+            ask_selection(
+                bot=bot,
+                state=state,
+                prompt="Choose faction to PLAY:",
+                options=opts_pick[uid],
+                user_id=uid,
+                chat_id=chat_id,
+                rng=rng,
+            )
+            for uid in user_order
+        ]
+    )
+    for uid, picked_i in zip(user_order, picks):
         selected[uid] = picked_i
-        remaining_factions.remove(picked_i)
-        # Ban
-        opts_ban_i = rng.sample(remaining_factions, k=n_per)
+        deck.extend(x for x in opts_pick[uid] if x != picked_i)
+
+    # BAN in order
+    for i, uid in list(enumerate(user_order)):
+        picked_i = selected[uid]
+        opts_ban_i = [deck.popleft() for _ in range(n_per)]
         banned_i = await ask_selection(
             bot=bot,
             state=state,
             prompt="Choose faction to BAN:",
             options=opts_ban_i,
             user_id=uid,
+            chat_id=chat_id,
+            rng=rng,
         )
         banned[uid] = banned_i
-        remaining_factions.remove(banned_i)
+        deck.extend(x for x in opts_ban_i if x != banned_i)
 
         # Notify folks of pick-ban
         uname = order_names[i]
         fac = picked_i
-        fac_info = [x for x in game.factions if x.name == picked_i][0]
+        fac_info = game.factions_by_name[picked_i]
         fac_link = fac_info.wiki
         fac_o = f'<a href="{fac_link}">{picked_i}</a>'
         await message.answer(f"{uname} picked {fac_o} and banned <b>{banned_i}</b>")
         # TODO: Selection of location too?...
 
     # Return results
+    loc_o = " at <b>(no location)</b>" if USE_LOCATION else ""
     msg = ["Finished game setup."]
-    for i, uid in enumerate(user_order):
-        uname = order_names[i]
+    for i, (uid, uname) in enumerate(zip(user_order, order_names), start=1):
         fac = selected[uid]
+        fac_o = f'<a href="{game.factions_by_name[fac].wiki}">{fac}</a>'
         ban_i = banned[uid]
-        fac_info = [x for x in game.factions if x.name == fac][0]
-        fac_link = fac_info.wiki
-        fac_o = f'<a href="{fac_link}">{fac}</a>'
-        loc = "(no location)"
-        loc_o = f" at <b>{loc}</b>" if USE_LOCATION else ""
-        msg.append(f"{i+1}. {uname} banned {ban_i}, playing as <b>{fac_o}</b>{loc_o}")
+        msg.append(f"{i}. {uname} banned {ban_i}, playing as <b>{fac_o}</b>{loc_o}")
 
     # Close game state
     msg.append("Have fun! Use /start to create a new one.")
     await message.answer("\n".join(msg), disable_web_page_preview=True)
-    del state.rooms[chat_id]
+    async with state.lock_for(chat_id):
+        state.close_room(chat_id)
 
 
 @router.message(Command(cmds["create_public_ban_pick"]), GroupOnly(), InLobby(state))
@@ -490,11 +568,15 @@ async def cmd_create_public_ban_pick(message: Message, bot: Bot) -> None:
     """Create a game setup."""
     chat_id = message.chat.id
     # uid = message.from_user.id  # noqa
-    room = state.rooms[chat_id]
-    if len(room.users) < MIN_PLAYERS:
+    async with state.lock_for(chat_id):
+        room = state.rooms.get(chat_id)
+        if room is None:
+            return
+        n_users = len(room.users)
+    if n_users < MIN_PLAYERS:
         await message.answer(f"Need at least {MIN_PLAYERS} players; some should /join")
         return
-    elif len(room.users) > MAX_PLAYERS:
+    elif n_users > MAX_PLAYERS:
         await message.answer(f"Need at most {MAX_PLAYERS} players; some should /leave")
         return
 
@@ -503,40 +585,49 @@ async def cmd_create_public_ban_pick(message: Message, bot: Bot) -> None:
         return
 
     # Set seed and RNG
-    seed = int(datetime.utcnow().timestamp() * 1000)
-    rng = Random(seed)  # noqa
-    await message.answer(f"Using seed: {seed}")
+    seed = time_ns()
+    rng = Random(seed)
     await message.answer_dice()
 
     # Create order
-    user_order = rng.sample(room.users, k=len(room.users))
-    order_mems = [await message.chat.get_member(x) for x in user_order]
-    order_names = [f"{get_at(x.user)}" for x in order_mems]
+    user_order = list(room.users)
+    rng.shuffle(user_order)
+    order_names = [room.user_names[x] for x in user_order]
     await message.answer(
-        "Choosing Order:\n"
+        f"Using seed: {seed}\n"
+        + "Choosing Order:\n"
         + "\n".join([f"{i+1}. {nm}" for i, nm in enumerate(order_names)])
     )
 
     # Select game mode
     game = base_game
 
-    remaining_factions = list(game.faction_names)
+    # Ordered set, so keyboards keep the usual faction order
+    remaining_factions = dict.fromkeys(game.faction_names)
 
     selected: dict[UserID, str] = {}
     banned: dict[UserID, str] = {}  # not used right now, but maybe later
 
-    # BAN in player order
-    await message.answer("BANNING (in order):")
-    for uid, uname in zip(user_order, order_names):
-        ban_i = await ask_selection(
-            bot=bot,
-            state=state,
-            prompt="Choose faction to BAN.",
-            options=remaining_factions,
-            user_id=uid,
-        )
+    # BAN at the same time; the picks only depend on the result of the whole phase
+    await message.answer("BANNING (all at once):")
+    ban_opts = list(remaining_factions)
+    bans: list[str] = await asyncio.gather(
+        *[
+            ask_selection(
+                bot=bot,
+                state=state,
+                prompt="Choose faction to BAN.",
+                options=ban_opts,
+                user_id=uid,
+                chat_id=chat_id,
+                rng=rng,
+            )
+            for uid in user_order
+        ]
+    )
+    for uid, uname, ban_i in zip(user_order, order_names, bans):
         banned[uid] = ban_i
-        remaining_factions.remove(ban_i)
+        remaining_factions.pop(ban_i, None)  # several players may ban the same one
         await message.answer(f"{uname} bans {ban_i}")
 
     # SELECT in reverse order
@@ -546,27 +637,37 @@ async def cmd_create_public_ban_pick(message: Message, bot: Bot) -> None:
             bot=bot,
             state=state,
             prompt="Choose faction to PLAY.",
-            options=remaining_factions,
+            options=list(remaining_factions),
             user_id=uid,
+            chat_id=chat_id,
+            rng=rng,
         )
         selected[uid] = sel_i
-        remaining_factions.remove(sel_i)
+        del remaining_factions[sel_i]
         await message.answer(f"{uname} plays as {sel_i}")
 
     # Return results
+    loc_o = " at <b>(no location)</b>" if USE_LOCATION else ""
     msg = ["Finished game setup."]
-    for i, uid in enumerate(user_order):
-        uname = order_names[i]
+    for i, (uid, uname) in enumerate(zip(user_order, order_names), start=1):
         fac = selected[uid]
+        fac_o = f'<a href="{game.factions_by_name[fac].wiki}">{fac}</a>'
         # ban_i = banned[uid]
-        fac_info = [x for x in game.factions if x.name == fac][0]
-        fac_link = fac_info.wiki
-        fac_o = f'<a href="{fac_link}">{fac}</a>'
-        loc = "(no location)"
-        loc_o = f" at <b>{loc}</b>" if USE_LOCATION else ""
-        msg.append(f"{i+1}. {uname} playing as <b>{fac_o}</b>{loc_o}")
+        msg.append(f"{i}. {uname} playing as <b>{fac_o}</b>{loc_o}")
 
     # Close game state
     msg.append("Have fun! Use /start to create a new one.")
     await message.answer("\n".join(msg), disable_web_page_preview=True)
-    del state.rooms[chat_id]
+    async with state.lock_for(chat_id):
+        state.close_room(chat_id)
+
+
+@router.message(
+    Command(
+        cmds["join"], cmds["leave"], *[v for k, v in cmds.items() if "create" in k]
+    ),
+    GroupOnly(),
+)
+async def cmd_no_lobby(message: Message) -> None:
+    """Reply to lobby commands when there is no lobby (registered last)."""
+    await message.answer("There is no active game. /start to create a new one.")
@@ -0,0 +1,128 @@
+"""Outgoing request throttling, to stay under Telegram's flood limits."""
+
+import asyncio
+import logging
+from time import monotonic
+from typing import TYPE_CHECKING
+
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_RATE = 30.0
+"""Requests per second that the bot may send overall."""
+
+CHAT_RATE = 1.0
+"""Sustained requests per second that the bot may send to a private chat."""
+
+GROUP_RATE = 20 / 60
+"""Sustained requests per second that the bot may send to a group (20 a minute)."""
+
+GROUP_BURST = 3
+"""How many requests a group chat may get in a quick burst."""
+
+PRIVATE_BURST = 3
+"""How many requests a private chat may get in a quick burst."""
+
+MAX_RETRIES = 3
+"""How many times to retry a request that still got flood-limited."""
+
+IDLE_EVICT = 10 * 60
+"""Seconds after which an unused chat bucket is forgotten (it's full by then)."""
+
+
+class TokenBucket(object):
+    """Token bucket limiter; callers wait in order for a free token."""
+
+    __slots__ = ("rate", "capacity", "_tokens", "_stamp", "_lock")
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._stamp = monotonic()
+        self._lock = asyncio.Lock()
+
+    def is_idle(self, now: float, idle_for: float) -> bool:
+        """Whether nobody has used (or is waiting on) this bucket for a while."""
+        return not self._lock.locked() and now - self._stamp > idle_for
+
+    def _refill(self) -> None:
+        now = monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._stamp) * self.rate
+        )
+        self._stamp = now
+
+    async def acquire(self) -> None:
+        """Wait until a token is available, then take it."""
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """Delays chat-bound requests so we send below the limits, not into a 429."""
+
+    def __init__(self):
+        self._global = TokenBucket(GLOBAL_RATE, int(GLOBAL_RATE))
+        self._chats: dict[int | str, TokenBucket] = {}
+        self._last_sweep = monotonic()
+
+    def _evict_idle(self) -> None:
+        """Drop idle chat buckets; a new one starts out full, just like them."""
+        now = monotonic()
+        if now - self._last_sweep < IDLE_EVICT:
+            return
+        self._last_sweep = now
+        idle = [k for k, b in self._chats.items() if b.is_idle(now, IDLE_EVICT)]
+        for k in idle:
+            del self._chats[k]
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            self._evict_idle()
+            # Positive IDs are private chats, groups and channels are negative
+            private = isinstance(chat_id, int) and chat_id > 0
+            if private:
+                bucket = TokenBucket(CHAT_RATE, PRIVATE_BURST)
+            else:
+                bucket = TokenBucket(GROUP_RATE, GROUP_BURST)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: "Bot",
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        # Only sends/edits target a chat; polling and callback answers pass through
+        chat_id = getattr(method, "chat_id", None)
+        retries = 0
+        while True:
+            if chat_id is not None:
+                await self._chat_bucket(chat_id).acquire()
+                await self._global.acquire()
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                retries += 1
+                if retries > MAX_RETRIES:
+                    raise
+                # Only this request waits; other chats keep going
+                logger.warning(f"Flood limit hit, retrying in {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
@@ -0,0 +1,115 @@
+"""CPU-heavy jobs that run in worker processes, away from the event loop."""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import cache, partial
+from io import BytesIO
+from typing import Any, Callable, TypeVar
+
+from PIL.Image import Image
+
+from ti4_tg_bot.map.gen_helper import MapGenHelper
+from ti4_tg_bot.map.milty import MiltyDraftState
+from ti4_tg_bot.map.ti4_map import TIMaybeMap
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+MAX_WORKERS = 4
+"""Upper limit on worker processes (we generate at most a few maps at once)."""
+
+
+@cache
+def shared_map_helper() -> MapGenHelper:
+    """Map generation helper, shared by all games (it keeps no per-game state)."""
+    return MapGenHelper()
+
+
+@cache
+def map_pool() -> ProcessPoolExecutor:
+    """Process pool for map generation and rendering, started on first use."""
+    # "spawn" doesn't inherit the event loop or sockets of the bot process
+    return ProcessPoolExecutor(
+        max_workers=min(MAX_WORKERS, os.cpu_count() or 1),
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+async def run_in_pool(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a (picklable) job in the process pool.
+
+    If a worker died (and broke the pool), the pool is replaced and the job retried.
+    """
+    loop = asyncio.get_running_loop()
+    job = partial(func, *args, **kwargs)
+    pool = map_pool()
+    try:
+        return await loop.run_in_executor(pool, job)
+    except BrokenProcessPool:
+        logger.warning("Map worker pool is broken, starting a new one.")
+        if map_pool() is pool:  # not already replaced by another job
+            map_pool.cache_clear()
+            pool.shutdown(wait=False, cancel_futures=True)
+        return await loop.run_in_executor(map_pool(), job)
+
+
+def _prep_rgb(img: Image, downscale: int) -> Image:
+    """Drop the alpha channel and optionally downscale."""
+    img = img.convert("RGB")
+    if downscale != 1:
+        w, h = img.size
+        img = img.resize((w // downscale, h // downscale))
+    return img
+
+
+def encode_jpeg(img: Image, *, downscale: int, quality: int) -> bytes:
+    """Encode an image as JPEG bytes, optionally downscaling it first."""
+    img = _prep_rgb(img, downscale)
+    tmpio = BytesIO()
+    img.save(tmpio, format="JPEG", quality=quality, subsampling=2, optimize=False)
+    return tmpio.getvalue()
+
+
+def random_map_job(
+    n_players: int, map_title: str, *, downscale: int, quality: int
+) -> tuple[TIMaybeMap, bytes]:
+    """Generate a random map and encode its image (runs in a worker)."""
+    my_map, my_img = shared_map_helper().gen_random_map(
+        n_players=n_players, map_title=map_title
+    )
+    return my_map, encode_jpeg(my_img, downscale=downscale, quality=quality)
+
+
+def import_map_job(
+    n_players: int, map_string: str, map_title: str, *, downscale: int, quality: int
+) -> tuple[TIMaybeMap, bytes]:
+    """Import a map from a map string and encode its image (runs in a worker)."""
+    my_map, my_img = shared_map_helper().import_map(
+        n_players=n_players, map_string=map_string, map_title=map_title
+    )
+    return my_map, encode_jpeg(my_img, downscale=downscale, quality=quality)
+
+
+def map_image_job(tmap: TIMaybeMap, *, downscale: int, quality: int) -> bytes:
+    """Render a map and encode it (runs in a worker)."""
+    img = tmap.to_image(shared_map_helper().path_imgs)
+    return encode_jpeg(img, downscale=downscale, quality=quality)
+
+
+def milty_map_job(
+    draft_state: MiltyDraftState, map_title: str, *, downscale: int, quality: int
+) -> bytes:
+    """Render the current draft map and encode it (runs in a worker)."""
+    _, img = shared_map_helper().milty_to_image(draft_state, map_title=map_title)
+    return encode_jpeg(img, downscale=downscale, quality=quality)
+
+
+def milty_slice_job(draft_state: MiltyDraftState, i: int, *, quality: int) -> bytes:
+    """Render and encode a single draft slice (runs in a worker)."""
+    img = draft_state.visualize_slice(i, shared_map_helper().path_imgs)
+    return encode_jpeg(img, downscale=1, quality=quality)
@@ -1,8 +1,11 @@
 """Data models."""
 
+from dataclasses import dataclass
 from enum import Enum
+from functools import cached_property
+from operator import attrgetter
 
-from pydantic import BaseModel, HttpUrl, model_validator
+from pydantic import BaseModel, ConfigDict, HttpUrl, model_validator
 
 
 class Wormhole(str, Enum):
@@ -45,7 +48,8 @@ class TechSpecialty(str, Enum):
     BLUE = "BLUE"
 
 
-class Planet(BaseModel):
+@dataclass(slots=True, frozen=True)
+class Planet:
     """Planet information."""
 
     name: str
@@ -68,31 +72,47 @@ class Tile(BaseModel):
 class TileSet(BaseModel):
     """Tile set."""
 
+    model_config = ConfigDict(defer_build=True, frozen=True)
+
     mecatol: Tile
     blue_tiles: list[Tile]
     red_tiles: list[Tile]
     home_tiles: list[Tile]
 
-    @property
+    @cached_property
     def all_tiles(self) -> list[Tile]:
         """Get all tiles as a list, sorted by number."""
         raw = [self.mecatol] + self.blue_tiles + self.red_tiles + self.home_tiles
-        res = sorted(raw, key=lambda x: x.number)
+        res = sorted(raw, key=attrgetter("number"))
+        return res
+
+    @cached_property
+    def tiles_by_number(self) -> dict[int, Tile]:
+        """All tiles, keyed by number."""
+        return {x.number: x for x in self.all_tiles}
+
+    @cached_property
+    def homes_by_race(self) -> dict[str, Tile | None]:
+        """Home tiles, keyed by race (None if the race is ambiguous)."""
+        res: dict[str, Tile | None] = {}
+        for ht in self.home_tiles:
+            if ht.race is not None:
+                res[ht.race] = None if ht.race in res else ht
         return res
 
     def get_faction_home(self, faction_name: str) -> Tile:
         """Get the home tile for some faction."""
-        found = [ht for ht in self.home_tiles if ht.race == faction_name]
-        if len(found) != 1:
+        found = self.homes_by_race.get(faction_name)
+        if found is None:
             raise ValueError(f"Unknown or ambigious faction name: {faction_name}")
-        return found[0]
+        return found
 
     def get_by_number(self, num: int) -> Tile:
         """Get a tile by number."""
-        for tile in self.all_tiles:
-            if tile.number == num:
-                return tile
-        raise ValueError(f"No tile exists for number: {num}")
+        try:
+            return self.tiles_by_number[num]
+        except KeyError:
+            raise ValueError(f"No tile exists for number: {num}") from None
 
     def __getitem__(self, val: int) -> Tile:
         """Get a tile by number (dict style)."""
@@ -102,7 +122,8 @@ class TileSet(BaseModel):
             raise KeyError(val) from ve
 
 
-class Faction(BaseModel):
+@dataclass(slots=True, frozen=True)
+class Faction:
     """Faction information."""
 
     name: str
@@ -112,15 +133,22 @@ class Faction(BaseModel):
 class GameInfo(BaseModel):
     """Game setup info."""
 
+    model_config = ConfigDict(defer_build=True, frozen=True)
+
     min_players: int
     max_players: int
     factions: list[Faction]
     tiles: TileSet
 
-    @property
-    def faction_names(self) -> list[str]:
+    @cached_property
+    def faction_names(self) -> tuple[str, ...]:
         """Faction names."""
-        return [x.name for x in self.factions]
+        return tuple(x.name for x in self.factions)
+
+    @cached_property
+    def factions_by_name(self) -> dict[str, Faction]:
+        """Factions, keyed by name."""
+        return {x.name: x for x in self.factions}
 
     @model_validator(mode="after")
     def _chk_faction_tiles(self) -> "GameInfo":
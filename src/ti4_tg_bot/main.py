@@ -1,23 +1,51 @@
 """Main loop."""
 
 import asyncio
+import json
 import logging
+import os
+from hashlib import sha256
+from pathlib import Path
 
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import BotCommand
 
 from ti4_tg_bot.bot.lobby_logic import cmds, r_lobby
+from ti4_tg_bot.bot.throttle import RateLimitMiddleware
+
+logger = logging.getLogger(__name__)
+
+CMDS_HASH_PATH = Path(os.environ.get("TI4TG_CMDS_HASH", "secret/.cmds_hash"))
+"""Where we remember which command list was last sent to Telegram."""
+
+
+async def sync_commands(bot: Bot, token: str, commands: list[BotCommand]) -> None:
+    """Set the bot's commands, unless the same ones were already set."""
+    bot_id = token.split(":", 1)[0]
+    payload = json.dumps([c.model_dump() for c in commands], sort_keys=True)
+    cmds_hash = sha256(f"{bot_id}:{payload}".encode()).hexdigest()[:16]
+    try:
+        if CMDS_HASH_PATH.read_text() == cmds_hash:
+            return
+    except OSError:
+        pass
+    await bot.set_my_commands(commands)
+    try:
+        # In the Docker image `secret/` is excluded, so make sure it exists
+        CMDS_HASH_PATH.parent.mkdir(parents=True, exist_ok=True)
+        CMDS_HASH_PATH.write_text(cmds_hash)
+    except OSError:
+        logger.warning(f"Could not save command hash to {CMDS_HASH_PATH!s}")
 
 
 async def async_main() -> None:
     """Async main runner."""
-    # Set up token
-    try:
-        with open("/run/secrets/tg_token") as f:
-            TOKEN = f.read()
-    except Exception:
-        with open("secret/tg_token") as f:
-            TOKEN = f.read()
+    # Set up token (Docker secret, else local file)
+    token_path = Path("/run/secrets/tg_token")
+    if not token_path.exists():
+        token_path = Path("secret/tg_token")
+    TOKEN = token_path.read_text().strip()
 
     # Set up storage
     if True:
@@ -32,9 +60,10 @@ async def async_main() -> None:
 
     # Initialize Bot instance with a default parse mode which will be passed to all API
     bot = Bot(TOKEN, parse_mode="HTML")
+    bot.session.middleware(RateLimitMiddleware())
 
-    # Set commands
-    await bot.set_my_commands([v for k, v in cmds.items()])
+    # Set commands (only if they changed since we last set them)
+    await sync_commands(bot, TOKEN, list(cmds.values()))
 
     # And the run events dispatching
     await dp.start_polling(bot)
@@ -42,7 +71,12 @@ async def async_main() -> None:
 
 def main():
     logging.basicConfig(level=logging.INFO)
-    asyncio.run(async_main())
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(async_main())
+    else:
+        uvloop.run(async_main())
 
 
 if __name__ == "__main__":
@@ -1,19 +1,20 @@
 """Map annotations."""
 
-from abc import abstractmethod
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 
-from pydantic import BaseModel
-
 from PIL.Image import Image
 from PIL.Image import new as new_img
-from PIL.ImageDraw import Draw
-from PIL.ImageFont import truetype
+from PIL.ImageDraw import Draw, ImageDraw
+from PIL.ImageFont import FreeTypeFont, truetype
 
 from .hexes import HexCoord
 
 
-class MapAnnotation(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class MapAnnotation(ABC):
     """Map annotation.
 
     Don't confuse with Python type annotations.
@@ -26,20 +27,42 @@ class MapAnnotation(BaseModel):
     def to_image(self) -> Image:
         """Convert to image."""
 
-    def add_to_image(self, img: Image, center: tuple[float, float]) -> None:
-        """Add self to image, with my center at given coordinates."""
+    def render_onto(
+        self, img: Image, center: tuple[float, float], d: ImageDraw | None = None
+    ) -> None:
+        """Draw self onto image, with my center at given coordinates.
+
+        If given, `d` is a drawing context for `img` that is shared between annotations.
+        """
         x_c, y_c = center[0] + self.offset[0], center[1] + self.offset[1]
         s_img = self.to_image()
         w, h = s_img.size
         x_left, y_top = int(x_c - w // 2), int(y_c - h // 2)
         img.paste(s_img, (x_left, y_top))
 
+    def add_to_image(self, img: Image, center: tuple[float, float]) -> None:
+        """Add self to image, with my center at given coordinates."""
+        self.render_onto(img, center)
+
 
 FONT_PATH = str(
     Path(__file__).parents[3] / "data" / "font" / "Handel-Gothic-D-Bold.otf"
 )
 
 
+@lru_cache(maxsize=32)
+def _get_font(size: int) -> FreeTypeFont:
+    """Load our font at the given size (only once per size)."""
+    return truetype(FONT_PATH, size=size)
+
+
+@lru_cache(maxsize=1024)
+def _text_bbox(font_size: int, text: str) -> tuple[int, int, int, int]:
+    """Bounding box of text in our font (labels like 'Seat 0' repeat a lot)."""
+    return _get_font(font_size).getbbox(text)
+
+
+@dataclass(slots=True, kw_only=True)
 class TextMapAnnotation(MapAnnotation):
     """Text-based map annotation."""
 
@@ -48,33 +71,48 @@ class TextMapAnnotation(MapAnnotation):
     font_size: int = 80
     rect_radius: int = 5
 
-    def to_image(self) -> Image:
-        """Convert to image."""
-        font_size = self.font_size
-        rect_radius = self.rect_radius
+    def _size(self) -> tuple[FreeTypeFont, int, int]:
+        """Font and size of the box around the text."""
+        font = _get_font(self.font_size)
+        _, _, w_txt, h_txt = _text_bbox(self.font_size, self.text)  # left top corner
+        return font, w_txt + self.rect_radius * 2, h_txt + self.rect_radius * 2
 
-        font = truetype(FONT_PATH, size=font_size)
-        _, _, w_txt, h_txt = font.getbbox(self.text)  # left top corner
-        w = w_txt + rect_radius * 2
-        h = h_txt + rect_radius * 2
-        img = new_img(
-            "RGBA",
-            size=(w, h),
-            color=(255, 255, 255, 0),
-        )
-        d = Draw(img)
+    def _draw_at(
+        self, d: ImageDraw, font: FreeTypeFont, box: tuple[int, int, int, int]
+    ):
+        """Draw the box and text, given the box corners."""
         d.rounded_rectangle(
-            (0, 0, w, h),
-            radius=rect_radius,
+            box,
+            radius=self.rect_radius,
             outline=(0, 0, 0, 255),  # black outline
             fill=(255, 255, 255, 255),  # white fill
             width=3,
         )
         d.multiline_text(
-            (rect_radius, rect_radius),
+            (box[0] + self.rect_radius, box[1] + self.rect_radius),
             self.text,
             font=font,
             fill=(0, 0, 0, 255),  # black stroke
             align="left",
         )
+
+    def to_image(self) -> Image:
+        """Convert to image."""
+        font, w, h = self._size()
+        img = new_img(
+            "RGBA",
+            size=(w, h),
+            color=(255, 255, 255, 0),
+        )
+        self._draw_at(Draw(img), font, (0, 0, w, h))
         return img
+
+    def render_onto(
+        self, img: Image, center: tuple[float, float], d: ImageDraw | None = None
+    ) -> None:
+        """Draw self straight onto image, without an intermediate image."""
+        x_c, y_c = center[0] + self.offset[0], center[1] + self.offset[1]
+        font, w, h = self._size()
+        x_left, y_top = int(x_c - w // 2), int(y_c - h // 2)
+        box = (x_left, y_top, x_left + w - 1, y_top + h - 1)  # same footprint
+        self._draw_at(Draw(img) if d is None else d, font, box)
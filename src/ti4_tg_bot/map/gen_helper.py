@@ -1,13 +1,13 @@
 """Helper for generating things."""
 
 import logging
-import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from random import Random, shuffle
-from typing import Literal
+from typing import Iterable, Literal
 
 from PIL.Image import Image
-from pydantic import BaseModel
 from pydantic_yaml import parse_yaml_file_as
 
 from ti4_tg_bot.data import base_game
@@ -23,26 +23,81 @@ logger = logging.getLogger(__name__)
 PATH_IMGS = Path(__file__).resolve().parents[3] / "data/tiles"
 PATH_LAYOUTS = Path(__file__).resolve().parents[3] / "data/layouts"
 
-MAP_STRING_REGEX = r"^\d{1,2}(?:\s\d{1,2}){35}$"
+MAP_STRING_LEN = 36  # tiles in a map string (all but Mecatol)
 
+_SPIRAL = tuple(get_spiral())  # map string order, starting from Mecatol
+_HOME_NAMES = ("A", "B", "C", "D", "E", "F")
+_COORD_FMT = "(%d, %d, %d)"  # coordinate annotation text
 
-class MapGenHelper(BaseModel):
+
+def _load_layout_file(yml_path: Path) -> TILayout | None:
+    """Load a single layout file, or None if it isn't a valid layout."""
+    try:
+        return parse_yaml_file_as(YamlTILayout, yml_path).fix_layout()
+    except Exception:
+        logger.warning(f"Failed to load file as layout: {yml_path!s}")
+        return None
+
+
+@lru_cache(maxsize=4)
+def _load_layouts(path_layouts: Path) -> tuple[TILayout, ...]:
+    """Load all layouts in a directory (parsed only once per directory)."""
+    yml_paths = list(path_layouts.rglob("*.yaml"))
+    with ThreadPoolExecutor(max_workers=min(8, len(yml_paths) or 1)) as ex:
+        loaded = list(ex.map(_load_layout_file, yml_paths))
+    return tuple(x for x in loaded if x is not None)
+
+
+def split_map_string(map_string: str) -> list[str] | None:
+    """Split a map string into its tile numbers, or None if it's malformed."""
+    if len(map_string) > 4 * MAP_STRING_LEN:
+        return None  # don't bother splitting huge inputs
+    toks = map_string.split()
+    if len(toks) != MAP_STRING_LEN:
+        return None
+    if not all(t.isdecimal() and len(t) <= 2 for t in toks):
+        return None
+    return toks
+
+
+def _coord_annotations(cells: Iterable[HexCoord]) -> list[TextMapAnnotation]:
+    """Label each of the cells with its cube coordinates."""
+    return [
+        TextMapAnnotation(
+            cell=cell, text=_COORD_FMT % cell.root, font_size=60, offset=(0, 200)
+        )
+        for cell in cells
+    ]
+
+
+class MapGenHelper(object):
     """Map generation helper object."""
 
+    # Class-level defaults; instances only store what was overridden
     path_imgs: Path = PATH_IMGS
     path_layouts: Path = PATH_LAYOUTS
     game_info: GameInfo = base_game
 
+    def __init__(
+        self,
+        path_imgs: Path | None = None,
+        path_layouts: Path | None = None,
+        game_info: GameInfo | None = None,
+    ):
+        if path_imgs is not None:
+            self.path_imgs = Path(path_imgs)
+        if path_layouts is not None:
+            self.path_layouts = Path(path_layouts)
+        if game_info is not None:
+            self.game_info = game_info
+
     def load_available_layouts(self) -> list[TILayout]:
         """Load all available layouts."""
-        res: list[TILayout] = []
-        for yml_path in list(self.path_layouts.rglob("*.yaml")):
-            try:
-                layout_i = parse_yaml_file_as(YamlTILayout, yml_path).fix_layout()
-                res.append(layout_i)
-            except Exception:
-                logger.warning(f"Failed to load file as layout: {yml_path!s}")
-        return res
+        return list(_load_layouts(self.path_layouts))
+
+    def player_counts(self) -> list[int]:
+        """Player counts that we have at least one layout for."""
+        return sorted({lyo.players for lyo in _load_layouts(self.path_layouts)})
 
     def load_layout(self, name: str) -> TILayout:
         """Load a layout with a given name."""
@@ -58,23 +113,23 @@ class MapGenHelper(BaseModel):
         map_title: str | None = None,
     ) -> tuple[TIMaybeMap, Image]:
         """Import a map from the given map string."""
-        if not re.match(MAP_STRING_REGEX, map_string):
+        toks = split_map_string(map_string)
+        if toks is None:
             raise ValueError("Bad map string.")
 
         # Get spiral coord
-        tile_nums = [18] + [int(x) for x in map_string.split()]
+        tile_nums = [18] + [int(x) for x in toks]
         coord_to_num: dict[HexCoord, int] = {}
-        for coord, tn in zip(get_spiral(), tile_nums):
+        for coord, tn in zip(_SPIRAL, tile_nums):
             coord_to_num[coord] = tn
 
         # Convert to
         cells = {}
         annots: list[TextMapAnnotation] = []
         home_num = 0
-        home_tiles = ["A", "B", "C", "D", "E", "F"]
         for coord, num in coord_to_num.items():
             if num == 0:
-                home_name = home_tiles[home_num]
+                home_name = _HOME_NAMES[home_num]
                 tile_i = PlaceholderTile(home_name=home_name)
                 home_num += 1
                 annots.append(
@@ -123,30 +178,20 @@ class MapGenHelper(BaseModel):
             random_map.cells[coord] = rand_tiles[i]
 
         # Add annotations
-        anns: list[TextMapAnnotation] = []
         # Coordinate annotations?
-        if coord_anns:
-            for cell in random_map.cells.keys():
-                anns.append(
-                    TextMapAnnotation(
-                        cell=cell,
-                        text=f"({cell.q}, {cell.r}, {cell.s})",
-                        font_size=60,
-                        offset=(0, 200),
-                    )
-                )
+        anns = _coord_annotations(random_map.cells) if coord_anns else []
         # Map Name?
         if map_title is not None:
             anns.append(
                 TextMapAnnotation(
-                    cell=(0, 0, 0),  # type: ignore
+                    cell=HexCoord(root=(0, 0, 0)),
                     text=map_title,
                     font_size=120,
                     offset=(0, -200),
                 )
             )
 
-        random_map.annotations = anns + random_map.annotations
+        random_map.annotations[:0] = anns
 
         # Make image
         img = random_map.to_image(base_path=self.path_imgs)
@@ -200,18 +245,8 @@ class MapGenHelper(BaseModel):
         maybe_map = draft_state.to_map()
 
         # Add annotations
-        anns: list[TextMapAnnotation] = []
         # Coordinate annotations?
-        if coord_anns:
-            for cell in maybe_map.cells.keys():
-                anns.append(
-                    TextMapAnnotation(
-                        cell=cell,
-                        text=f"({cell.q}, {cell.r}, {cell.s})",
-                        font_size=60,
-                        offset=(0, 200),
-                    )
-                )
+        anns = _coord_annotations(maybe_map.cells) if coord_anns else []
         # Map Name?
         if map_title is not None:
             anns.append(
@@ -236,7 +271,7 @@ class MapGenHelper(BaseModel):
             seat_coord = seat_coord.rotate_clockwise_60()  # rotates around
 
         # Prepend these annotations
-        maybe_map.annotations = anns + maybe_map.annotations
+        maybe_map.annotations[:0] = anns
 
         # Make image
         img = maybe_map.to_image(base_path=self.path_imgs)
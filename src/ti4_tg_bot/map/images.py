@@ -2,6 +2,7 @@
 
 from PIL.Image import Image
 from PIL.Image import new as img_new
+from PIL.ImageDraw import Draw
 
 
 from .annots import TextMapAnnotation
@@ -63,8 +64,9 @@ class HexImageField(HexField[Image]):
                 lower_i + offset_y,
             )
             res.paste(img_i, new_bbox, mask=img_i)
+        d = Draw(res)  # shared by all annotations
         for ann in self.annotations:
             xc, yc = self.cell_to_xy(ann.cell)
-            ann.add_to_image(res, center=(offset_x + xc, offset_y + yc))
+            ann.render_onto(res, center=(offset_x + xc, offset_y + yc), d=d)
 
         return res
@@ -415,26 +415,31 @@ class MiltyDraftState(BaseModel):
     ) -> list[Image]:
         """Visualize slices."""
         res: list[Image] = []
-        for i, slice in enumerate(self.slices):
+        for i in range(len(self.slices)):
             if only_available and i in [x[0] for x in self.available_slices]:
                 # skip unavailable slices (if option is on)
                 continue
-            cells_i = slice.to_tile_dict()
-            cells_i[HexCoord(root=(0, 0, 0))] = self.mecatol
-            xc = HexCoord(root=(0, -3, 3))
-            annot_i = [
-                TextMapAnnotation(cell=xc, text=f"Slice {i}"),
-                TextMapAnnotation(
-                    cell=xc,
-                    text=slice.evaluate_slice().human_description,
-                    offset=(0, 80),
-                    font_size=40,
-                ),
-            ]
-            part_i = TIMaybeMap(cells=cells_i, annotations=annot_i)
-            res.append(part_i.to_image(base_path))
+            res.append(self.visualize_slice(i, base_path))
         return res
 
+    def visualize_slice(self, i: int, base_path: Path) -> Image:
+        """Visualize a single slice."""
+        slice = self.slices[i]
+        cells_i = slice.to_tile_dict()
+        cells_i[HexCoord(root=(0, 0, 0))] = self.mecatol
+        xc = HexCoord(root=(0, -3, 3))
+        annot_i = [
+            TextMapAnnotation(cell=xc, text=f"Slice {i}"),
+            TextMapAnnotation(
+                cell=xc,
+                text=slice.evaluate_slice().human_description,
+                offset=(0, 80),
+                font_size=40,
+            ),
+        ]
+        part_i = TIMaybeMap(cells=cells_i, annotations=annot_i)
+        return part_i.to_image(base_path)
+
     def visualize_factions(
         self, base_path: Path, only_available: bool = False
     ) -> list[Image]:
@@ -450,7 +455,7 @@ class MiltyDraftState(BaseModel):
                 cells={(0, 0, 0): home},  # type: ignore
                 annotations=[
                     TextMapAnnotation(
-                        cell=(0, 0, 0),  # type: ignore
+                        cell=HexCoord(root=(0, 0, 0)),
                         offset=(0, 250),
                         text=fac.name,
                         font_size=50,
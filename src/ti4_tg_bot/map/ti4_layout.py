@@ -54,7 +54,7 @@ class TILayout(BaseModel):
         """Convert to map."""
         cells = {}
         annotations: list[TextMapAnnotation] = []
-        num_to_tile = {x.number: x for x in game_info.tiles.all_tiles}
+        num_to_tile = game_info.tiles.tiles_by_number
         # Set free tiles
         for coord in self.free_tiles:
             cells[coord] = PlaceholderTile()
@@ -0,0 +1,41 @@
+"""Per-chat locks that are forgotten once nobody uses them."""
+
+from asyncio import Lock
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+
+class KeyedLocks(Generic[K]):
+    """One asyncio lock per key, e.g. per chat.
+
+    Use as `async with locks[key]: ...`. Each entry counts the callers holding or
+    waiting on its lock, and is removed when the last one leaves. So no caller can
+    ever get a different lock for the same key than one still in use, and idle
+    chats cost nothing.
+    """
+
+    __slots__ = ("_entries",)
+
+    def __init__(self):
+        self._entries: dict[K, tuple[Lock, list[int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @asynccontextmanager
+    async def __getitem__(self, key: K) -> AsyncIterator[None]:
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = (Lock(), [0])
+        lock, users = entry
+        users[0] += 1
+        try:
+            async with lock:
+                yield
+        finally:
+            users[0] -= 1
+            if users[0] == 0:
+                del self._entries[key]
@@ -1,8 +1,12 @@
 """Model for rooms."""
 
 from asyncio import Queue
+from contextlib import AbstractAsyncContextManager
+
 from pydantic import BaseModel
 
+from .locks import KeyedLocks
+
 ChatID = int
 UserID = int
 
@@ -11,7 +15,17 @@ class Room(BaseModel):
     """A room, specified by a chat."""
 
     chat: ChatID
-    users: list[UserID] = []
+    users: dict[UserID, None] = {}  # ordered set, in join order
+    user_names: dict[UserID, str] = {}  # '@username' or full name, set on join
+
+    def add_user(self, uid: UserID, name: str) -> None:
+        """Add a user (no-op if already present, apart from refreshing the name)."""
+        self.users[uid] = None
+        self.user_names[uid] = name
+
+    def remove_user(self, uid: UserID) -> None:
+        """Remove a user, if present (their name stays cached)."""
+        self.users.pop(uid, None)
 
 
 class GlobalState:
@@ -24,3 +38,17 @@ class GlobalState:
     ):
         self.rooms = dict(rooms)
         self.queues = dict(queues)
+        # Kept while held or awaited, so closing a room can't swap its lock
+        self.locks: KeyedLocks[ChatID] = KeyedLocks()
+
+    def lock_for(self, chat_id: ChatID) -> AbstractAsyncContextManager[None]:
+        """Get the lock guarding a chat's room (use with `async with`)."""
+        return self.locks[chat_id]
+
+    def close_room(self, chat_id: ChatID) -> None:
+        """Remove a chat's room (if any)."""
+        self.rooms.pop(chat_id, None)
+
+
+state = GlobalState()
+"""The shared state; use this instead of creating another GlobalState."""
@@ -0,0 +1,44 @@
+"""Tests for outgoing request throttling."""
+
+import asyncio
+
+from aiogram.methods import SendMessage
+
+from ti4_tg_bot.bot import throttle
+from ti4_tg_bot.bot.throttle import GROUP_BURST, RateLimitMiddleware
+
+
+def test_group_sends_are_spaced_out(monkeypatch):
+    """A group gets a small burst, then at most 20 requests a minute."""
+    clock = [0.0]
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay: float) -> None:
+        clock[0] += delay
+        await real_sleep(0)
+
+    monkeypatch.setattr(throttle, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(throttle.asyncio, "sleep", fake_sleep)
+
+    sent_at: list[float] = []
+
+    async def make_request(bot, method):
+        sent_at.append(clock[0])
+        return None
+
+    async def main() -> None:
+        mw = RateLimitMiddleware()
+        method = SendMessage(chat_id=-100123, text="hi")
+        for _ in range(25):
+            await mw(make_request, None, method)
+
+    asyncio.run(main())
+
+    assert len(sent_at) == 25
+    # Only a small burst goes out at once...
+    assert GROUP_BURST <= 5
+    assert sent_at[GROUP_BURST - 1] == 0.0
+    # ...after which requests follow Telegram's 20 per minute, i.e. 3s apart
+    gaps = [b - a for a, b in zip(sent_at[GROUP_BURST - 1 :], sent_at[GROUP_BURST:])]
+    assert all(g >= 3.0 - 1e-6 for g in gaps)
+    assert sent_at[20] >= 60 - 3.0 * GROUP_BURST